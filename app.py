@@ -1,6 +1,9 @@
 import streamlit as st
 import pandas as pd
-from utils.extractor import run_extraction
+from utils.extractor import run_extraction_with_realtime_logs
+from utils.jobs import get_job
+from utils.data_loader import load_csv
+from utils.exports import file_download_menu
 import os
 import sys
 
@@ -20,47 +23,15 @@ def show_home():
 
 
 def show_download():
-    """Página de extracción y visualización de datos."""
+    """Lanza (o retoma) la extracción en segundo plano y abre su página de progreso."""
     st.header("📥 Extracción de Datos")
 
-    # Botón para iniciar extracción
     if st.button("🚀 Iniciar Proceso de Extracción", type="primary"):
-        # Crear contenedor para logs
-        log_container = st.empty()
-
-        # Redirigir la salida estándar a Streamlit para mostrar logs en tiempo real
-        import sys
-        import time
-
-        log_container = st.empty()
-        class StreamlitWriter:
-            """Escribe cada mensaje en un contenedor Streamlit en tiempo real."""
-            def __init__(self, container):
-                self.container = container
-                self.logs = ""
-            def write(self, message):
-                # Añadir el nuevo mensaje y actualizar la UI
-                self.logs += str(message)
-                # Utilizamos code() para formato monoespaciado
-                self.container.code(self.logs)
-                # Pequeña pausa para permitir al frontend renderizar
-                time.sleep(0.05)
-            def flush(self):
-                pass  # Necesario para compatibilidad con sys.stdout
-
-        old_stdout = sys.stdout
-        writer = StreamlitWriter(log_container)
-        sys.stdout = writer
-
-        status = st.status("Ejecutando el proceso de extracción…", expanded=True)
-        try:
-            run_extraction()
-            sys.stdout = old_stdout
-            status.update(label="Proceso completado ✅", state="complete")
-            show_extracted_data()
-        except Exception as e:
-            sys.stdout = old_stdout
-            status.update(label=f"Error: {e}", state="error")
+        # La extracción corre fuera del script (utils/jobs.py); si ya hay una
+        # en curso no se lanza otra, se muestra la existente
+        get_job("extraction", run_extraction_with_realtime_logs).start()
+        st.session_state.page = "Descargar Datos"
+        st.switch_page("pages/home.py")
 
 
 def login():
@@ -129,17 +100,12 @@ def show_extracted_data():
     if selected_file:
         file_path = os.path.join(output_dir, selected_file)
         try:
-            df = pd.read_csv(file_path)
+            df = load_csv(file_path)
             st.write(f"**{selected_file}** - {len(df)} filas:")
             st.dataframe(df)
             
             # Opción para descargar
-            st.download_button(
-                label="⬇️ Descargar archivo CSV",
-                data=df.to_csv(index=False).encode('utf-8'),
-                file_name=selected_file,
-                mime='text/csv',
-            )
+            file_download_menu(file_path, "⬇️ Descargar archivo", key="extraidos")
             
         except Exception as e:
             st.error(f"Error al cargar el archivo {selected_file}: {str(e)}")
@@ -2,9 +2,39 @@ import streamlit as st
 import pandas as pd
 import os
 import altair as alt
-import time
-from datetime import datetime
 from utils.extractor import run_extraction_with_realtime_logs
+from utils.data_loader import (
+    ensure_mart, load_athlete_series, load_facets, load_mart, load_csv, load_norms, load_profile_index,
+    load_test_index, load_traces,
+)
+from utils import logs, query
+from utils.aggregates import NOT_METRICS
+from utils.mart import MARTS, mart_version
+from utils.chart_data import downsample_series, norm_bands, scatter_data, summary_by, trace_data
+from utils import norms
+from utils.exports import download_menu, file_download_menu
+from utils.jobs import get_job
+from utils.metrics import load_last_report, report_tables
+from utils.transforms import age_at
+
+# Columnas de fecha de las tablas materializadas (sin hora) y claves ocultas
+COLUMN_CONFIG = {
+    "Fecha Test": st.column_config.DateColumn("Fecha Test"),
+    "Fecha de nacimiento": st.column_config.DateColumn("Fecha de nacimiento"),
+    "profileId": None,
+    "testId": None,
+}
+
+# Tablas con series longitudinales por atleta
+TREND_TABLES = {name: spec["label"] for name, spec in MARTS.items()}
+
+# Opciones de filas por página en las tablas
+PAGE_SIZES = [25, 50, 100, 250, 1000]
+
+# Cada cuántos segundos se consulta el estado de la extracción en curso y
+# cuántas líneas de su log se muestran
+JOB_POLL_SECONDS = 2
+JOB_LOG_LINES = 30
 
 # Configurar página
 st.set_page_config(
@@ -13,6 +43,29 @@ st.set_page_config(
     layout="wide"
 )
 
+def pagination(total, key):
+    """Controles de paginación; devuelve (offset, limit) de la página visible."""
+    col_size, col_page, col_info = st.columns([1, 1, 2])
+    with col_size:
+        page_size = st.selectbox("Filas por página", PAGE_SIZES, index=1, key=f"{key}_size")
+    pages = max(1, -(-total // page_size))
+    with col_page:
+        page = st.number_input("Página", min_value=1, value=1, step=1, key=f"{key}_page")
+    page = min(int(page), pages)
+    with col_info:
+        st.caption(f"Página {page} de {pages}")
+    return (page - 1) * page_size, page_size
+
+
+def show_paged_table(name, filtros, key):
+    """Tabla paginada en el servidor: solo se consulta y envía la página visible."""
+    total = query.count(name, filtros)
+    with st.expander(f"🗒️ Tabla completa ({total} filas)"):
+        offset, limit = pagination(total, key)
+        df_page = query.select(name, filtros, limit=limit, offset=offset)
+        st.dataframe(df_page, use_container_width=True, column_config=COLUMN_CONFIG)
+
+
 def show_home():
     """Página principal con información de la aplicación."""
     st.title("🌟 VALD Data Extraction App")
@@ -36,15 +89,10 @@ def show_extracted_data():
     if selected_file:
         file_path = os.path.join(output_dir, selected_file)
         try:
-            df = pd.read_csv(file_path)
+            df = load_csv(file_path)
             st.write(f"**{selected_file}** - {len(df)} filas:")
             st.dataframe(df)
-            st.download_button(
-                label="⬇️ Descargar archivo CSV",
-                data=df.to_csv(index=False).encode("utf-8"),
-                file_name=selected_file,
-                mime="text/csv",
-            )
+            file_download_menu(file_path, "⬇️ Descargar archivo", key="extraidos")
         except Exception as e:
             st.error(f"Error al cargar el archivo {selected_file}: {str(e)}")
 
@@ -64,146 +112,171 @@ def show_download():
 
         Los datos se guardan en archivos CSV en la carpeta `output_data`.
         """)
-    if st.button("🚀 Iniciar Proceso de Extracción", type="primary"):
-        log_area = st.empty()
-        progress_bar = st.progress(0.0)
+    job = extraction_job()
+    if st.button("🚀 Iniciar Proceso de Extracción", type="primary", disabled=job.is_running()):
+        _, started = job.start()
+        if not started:
+            st.info("ℹ️ Ya hay una extracción en curso: se muestra su progreso.")
+    level = st.selectbox("Nivel de log", logs.LEVELS, index=logs.LEVELS.index("INFO"), key="job_log_level")
+    if job.is_running():
+        show_job_progress(level)
+        return
+    status = job.status()
+    if status["state"] == "done":
+        st.success(f"✅ Última extracción completada ({status['finished']})")
+        show_run_metrics()
+        show_extracted_data()
+    elif status["state"] == "error":
+        st.error(f"❌ Error durante la extracción: {status['error']}")
+        show_run_metrics()
+    elif status["state"] == "interrupted":
+        st.warning(f"⚠️ La extracción iniciada el {status['started']} se interrumpió")
+    if status["log"]:
+        with st.expander("🗒️ Log de la última extracción"):
+            st.code(logs.format_entries(status["log"], level))
+
+
+def show_run_metrics():
+    """Tiempos por etapa y requests por host de la última extracción (utils/metrics.py)."""
+    report = load_last_report()
+    if report is None:
+        return
+    stages, hosts = report_tables(report)
+    st.subheader("⏱️ Tiempos de la última extracción")
+    st.caption(f"Modo {report.get('mode', '-')} · {report['seconds']:.1f} s en total · iniciada {report['started']}")
+    st.dataframe(stages, use_container_width=True, hide_index=True)
+    if not hosts.empty:
+        with st.expander("🌐 Requests por host"):
+            st.dataframe(hosts, use_container_width=True, hide_index=True)
 
-        def log_cb(message: str):
-            timestamp = datetime.now().strftime("%H:%M:%S")
-            log_area.write(f"{timestamp} | {message}")
 
-        def progress_cb(current: int, total: int, text: str):
-            progress_bar.progress(current / total, text)
+def extraction_job():
+    """Trabajo de extracción compartido por todas las sesiones (utils/jobs.py)."""
+    return get_job("extraction", run_extraction_with_realtime_logs)
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_job_progress(level):
+    """Progreso de la extracción en curso; solo este bloque se refresca."""
+    status = extraction_job().status()
+    if status["state"] != "running":
+        # Terminó: rerun completo para mostrar el resultado y dejar de consultar
+        st.rerun()
+    st.progress(min(1.0, status["step"] / max(status["total"], 1)), status["text"])
+    st.caption(f"Iniciada el {status['started']}")
+    st.code(logs.format_entries(status["log"], level, limit=JOB_LOG_LINES) or "…")
 
-        try:
-            run_extraction_with_realtime_logs(log_cb, progress_cb)
-            progress_bar.progress(1.0, "Completado")
-            st.success("✅ Proceso de extracción completado con éxito")
-            show_extracted_data()
-        except Exception as e:
-            st.error(f"❌ Error durante la extracción: {e}")
+
+def show_norms(name, version, metric, filtros):
+    """
+    Bandas de percentiles normativos por edad de `metric` (según el plantel y
+    tipo de test del filtro) y, con un solo jugador, el percentil de su último test.
+    """
+    test_column = MARTS[name]["test_column"]
+    st.subheader("📐 Percentiles normativos por edad")
+    norma = {"Grupo": filtros.get("Grupo"), "Test": filtros.get(test_column)}
+    bands_df = norm_bands(name, version, metric, norma)
+    tab_bands, tab_bands_table = st.tabs(["📈 Gráfico", "📋 Tabla"])
+    with tab_bands:
+        base = alt.Chart(bands_df).encode(x=alt.X("Edad:O", sort="x"))
+        chart_bands = (
+            base.mark_bar(color="#c6dbef").encode(y=alt.Y("P10:Q", title=metric), y2="P90:Q")
+            + base.mark_bar(color="#6baed6", size=8).encode(y="P25:Q", y2="P75:Q")
+            + base.mark_tick(color="#08306b", thickness=2).encode(y="P50:Q", tooltip=list(bands_df.columns))
+        ).properties(height=300)
+        st.altair_chart(chart_bands, use_container_width=True)
+    with tab_bands_table:
+        st.dataframe(bands_df, use_container_width=True)
+
+    # Percentil del último test del jugador frente a su norma (mismo test, plantel y edad)
+    digests = load_norms()
+    if digests is None or len(filtros.get("Jugador") or []) != 1:
+        return
+    ultimo = query.select(
+        name, {"Jugador": filtros["Jugador"]}, columns=["Fecha Test", test_column, "Grupo", "Edad", metric]
+    ).sort_values("Fecha Test").dropna(subset=[metric]).tail(1)
+    if ultimo.empty:
+        return
+    fila = ultimo.iloc[0]
+    percentil = norms.percentile_of(
+        digests, name, metric, fila[metric],
+        {"Test": [fila[test_column]], "Grupo": [fila["Grupo"]], "Edad": [fila["Edad"]]},
+    )
+    st.metric(
+        f"{filtros['Jugador'][0]} · {fila[test_column]} ({fila['Fecha Test']:%d/%m/%Y})",
+        f"{fila[metric]:.2f}",
+        f"Percentil {percentil:.0f} en {fila['Grupo']}, {fila['Edad']} años",
+        delta_color="off",
+    )
 
 
 def show_nordbord():
     """Muestra los datos del archivo all_nordbord.csv"""
-    csv_path = "utils/output_data/all_nordbord.csv"
     st.header("🦵 Datos NordBord")
-    if not os.path.exists(csv_path):
-        st.warning("El archivo all_nordbord.csv no existe. Ejecuta la extracción primero.")
-        return
     try:
-        df_tests = pd.read_csv(csv_path)
-        profiles_path = "utils/output_data/all_profiles.csv"
-        if os.path.exists(profiles_path):
-            df_profiles = pd.read_csv(profiles_path)[["profileId","givenName","familyName","dateOfBirth","groupName"]]
-            df = df_tests.merge(df_profiles, on="profileId", how="left")
-            # Eliminar tests sin perfil asociado
-            df = df.dropna(subset=["givenName","familyName","dateOfBirth"])
-            # Forzar columna Grupo a partir de groupName y limpiar
-            df["Grupo"] = df["groupName"]
-            # Renombrar columnas
-            df = df.rename(columns={"givenName": "Nombre", "familyName": "Apellido", "dateOfBirth": "Fecha de nacimiento", "testTypeName": "Test", "device": "Dispositivo", "leftAvgForce": "L Avg Force (N)", "rightAvgForce": "R Avg Force (N)", "leftMaxForce": "L Max Force (N)", "rightMaxForce": "R Max Force (N)", "leftTorque": "L Max Torque (Nm)", "rightTorque": "R Max Torque (Nm)", "leftRepetitions": "L Reps", "rightRepetitions": "R Reps", "leftImpulse": "L Max Impulse (Ns)", "rightImpulse": "R Max Impulse (Ns)","notes": "Notas"})
-
+        if not ensure_mart("nordbord"):
+            st.warning("El archivo all_nordbord.csv no existe. Ejecuta la extracción primero.")
+            return
+        # Los filtros se aplican en DuckDB sobre la tabla materializada
+        version = mart_version("nordbord")
+        filtros = {}
+        facets = load_facets("nordbord")
+        if "Jugador" in facets.columns():
             # ------------------ Filtros ------------------
-            # Fecha del test como columna fecha
-            df["Fecha Test"] = pd.to_datetime(df_tests["testDateUtc"], errors="coerce").dt.date
-            
+            # Opciones, cantidades y rango de fechas salen del índice de facetas
             # ---- Filtros (primera fila) ----
-            fecha_series = df["Fecha Test"].dropna()
-            min_date = fecha_series.min() if not fecha_series.empty else None
-            max_date = fecha_series.max() if not fecha_series.empty else None
+            min_date, max_date = facets.bounds()
+            min_date = min_date.date() if min_date is not None else None
+            max_date = max_date.date() if max_date is not None else None
 
-            grupos = sorted(df["Grupo"].dropna().unique()) if "Grupo" in df.columns else []
-            test_types = sorted(df["Test"].dropna().unique())
+            grupos = facets.counts("Grupo")
+            test_types = facets.counts("Test")
 
             col1, col2, col3 = st.columns(3)
             with col1:
                 fecha_inicio, fecha_fin = st.date_input("Rango de fechas", (min_date, max_date), key="nb_fecha")
             with col2:
-                sel_grupo = st.multiselect("Plantel", options=grupos, default=[], key="nb_grupo")
+                sel_grupo = st.multiselect(
+                    "Plantel", options=list(grupos), default=[], key="nb_grupo",
+                    format_func=lambda g: f"{g} ({grupos[g]})",
+                )
             with col3:
-                sel_tests = st.multiselect("Tipo de test", options=test_types, default=[], key="nb_test")
+                sel_tests = st.multiselect(
+                    "Tipo de test", options=list(test_types), default=[], key="nb_test",
+                    format_func=lambda t: f"{t} ({test_types[t]})",
+                )
 
-            # Aplicar filtros seleccionados
-            if fecha_inicio and fecha_fin:
-                df = df[df["Fecha Test"].notna() & (df["Fecha Test"] >= fecha_inicio) & (df["Fecha Test"] <= fecha_fin)]
-            if sel_grupo:
-                df = df[df["Grupo"].isin(sel_grupo)]
-            if sel_tests:
-                df = df[df["Test"].isin(sel_tests)]
+            # Filtros seleccionados
+            filtros = {
+                "Fecha Test": query.between(fecha_inicio, fecha_fin),
+                "Grupo": sel_grupo,
+                "Test": sel_tests,
+            }
 
             # ---- Filtro Jugador (segunda fila) ----
-            df["Jugador"] = (df["Nombre"] + " " + df["Apellido"]).str.strip()
-            jugadores = sorted(df["Jugador"].unique())
-            sel_jug = st.multiselect("Jugador", options=jugadores, default=[])
-            if sel_jug:
-                df = df[df["Jugador"].isin(sel_jug)]
-
-            # Selector plantel (groupName)
-            grupos = sorted(df["Grupo"].dropna().unique()) if "Grupo" in df.columns else []
-            
-            if sel_grupo:
-                df = df[df["Grupo"].isin(sel_grupo)]
-            # Formatear fecha y calcular edad
-            df["Fecha de nacimiento"] = pd.to_datetime(df["Fecha de nacimiento"]).dt.date
-            today = pd.to_datetime("today").date()
-            df["Edad"] = df["Fecha de nacimiento"].apply(lambda d: today.year - d.year - ((today.month, today.day) < (d.month, d.day)))
-            # Calcular Max Imbalance (%) si existen las columnas de fuerza
-            if {"L Max Force (N)", "R Max Force (N)"}.issubset(df.columns):
-                df["Max Imbalance (%)"] = (df["R Max Force (N)"] - df["L Max Force (N)"]).abs() / df[["L Max Force (N)", "R Max Force (N)"]].max(axis=1) * 100
-            if {"L Avg Force (N)", "R Avg Force (N)"}.issubset(df.columns):
-                df["Avg Imbalance (%)"] = (df["R Avg Force (N)"] - df["L Avg Force (N)"]).abs() / df[["L Avg Force (N)", "R Avg Force (N)"]].max(axis=1) * 100
-            if {"L Max Impulse (Ns)", "R Max Impulse (Ns)"}.issubset(df.columns):
-                df["Impulse Imbalance (%)"] = (df["R Max Impulse (Ns)"] - df["L Max Impulse (Ns)"]).abs() / df[["L Max Impulse (Ns)", "R Max Impulse (Ns)"]].max(axis=1) * 100
-            # Asegurar columnas numéricas y redondear a 2 decimales
-            for col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='ignore')
-            num_cols = df.select_dtypes(include='number').columns
-            df[num_cols] = df[num_cols].round(2)
-            # Eliminar columnas no deseadas
-            cols_to_drop = ["profileId", "testId", "modifiedDateUtc", "testDateUtc", "testTypeId", "tenant_id","leftCalibration", "rightCalibration", "categoryName", "groupName"]
-            df = df.drop(columns=[c for c in cols_to_drop if c in df.columns])
-            # Reordenar columnas según preferencia
-            desired_order = [
-                "Fecha Test", "Nombre", "Apellido", "Grupo", "Fecha de nacimiento", "Edad", "Dispositivo", "Test", "L Reps", "R Reps",
-                "L Max Force (N)", "R Max Force (N)", "Max Imbalance (%)", "L Max Torque (Nm)", "R Max Torque (Nm)",
-                "L Avg Force (N)", "R Avg Force (N)", "Avg Imbalance (%)", "L Max Impulse (Ns)", "R Max Impulse (Ns)",
-                "Impulse Imbalance (%)", "Notas"
-            ]
-            existing_cols = [c for c in desired_order if c in df.columns]
-            remaining_cols = [c for c in df.columns if c not in existing_cols]
-            df = df[existing_cols + remaining_cols]
-        else:
-            df = df_tests
-        # Conservar columnas relevantes
-        # Name,"ExternalId","Date UTC","Time UTC","Device","Test","L Reps","R Reps","L Max Force (N)","R Max Force (N)","Max Imbalance (%)","L Max Torque (Nm)","R Max Torque (Nm)","L Avg Force (N)","R Avg Force (N)","Avg Imbalance (%)","L Max Impulse (Ns)","R Max Impulse (Ns)","Impulse Imbalance (%)","Notes"
-        # cols = [
-        #     "Name","ExternalId","Date UTC","Time UTC","Device","Test","L Reps","R Reps",
-        #     "L Max Force (N)","R Max Force (N)","Max Imbalance (%)","L Max Torque (Nm)","R Max Torque (Nm)",
-        #     "L Avg Force (N)","R Avg Force (N)","Avg Imbalance (%)","L Max Impulse (Ns)","R Max Impulse (Ns)",
-        #     "Impulse Imbalance (%)","Notes"
-        # ]
-        # df = df[cols]
-        with st.expander(f"🗒️ Tabla completa ({len(df)} filas)"):
-            st.dataframe(df, use_container_width=True)
+            jugadores = facets.counts("Jugador", filtros)
+            sel_jug = st.multiselect(
+                "Jugador", options=list(jugadores), default=[],
+                format_func=lambda j: f"{j} ({jugadores[j]})",
+            )
+            filtros["Jugador"] = sel_jug
+
+        columnas = query.columns("nordbord")
+        show_paged_table("nordbord", filtros, key="nb_tabla")
 
         # ---------------- Estadísticas por edad ----------------
-        numeric_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c]) and c not in ["Edad"]]
+        numeric_cols = [c for c in query.numeric_columns("nordbord") if c not in ["Edad"]]
         if numeric_cols:
             var_sel = st.selectbox("Variable para analizar:", numeric_cols, index=0, key="nb_var")
-            stats_df = (
-                df.groupby("Edad")[var_sel]
-                .agg(Min="min", Max="max")
-                .reset_index()
-                .sort_values("Edad")
-            )
+            # Min/Max/Media por edad calculados en la consulta y cacheados por filtro
+            agg_df, overall_mean = summary_by("nordbord", version, filtros, "Edad", var_sel)
+            stats_df = agg_df[["Edad", "Min", "Max"]]
             st.subheader("📊 Valores mínimo y máximo por edad")
             # Tabs para mostrar gráfico (por defecto) y tabla
             tab_chart, tab_table = st.tabs(["📈 Gráfico", "📋 Tabla"])
 
             # ---- Gráfico ----
-            mean_df = df.groupby("Edad")[var_sel].mean().reset_index(name="Media")
-            overall_mean = df[var_sel].mean()
+            mean_df = agg_df[["Edad", "Media"]]
             chart_mean = (
                 alt.Chart(mean_df)
                 .mark_bar(color="#2ca02c")
@@ -226,150 +299,267 @@ def show_nordbord():
             with tab_table:
                 st.dataframe(stats_df, use_container_width=True)
 
+            # ---------------- Percentiles normativos ----------------
+            show_norms("nordbord", version, var_sel, filtros)
+
         st.subheader("⚖️ Dispersión Fuerza Máxima Izquierda vs Derecha")
         # Gráfico comparativo de fuerzas máximas izquierda vs derecha
         tooltip_candidates = ["Nombre","Apellido","Date UTC","L Max Force (N)","R Max Force (N)"]
-        tooltip_cols = [c for c in tooltip_candidates if c in df.columns]
-        chart = (
-            alt.Chart(df)
-            .mark_circle(size=60, color="#1f77b4")
-            .encode(
-                x=alt.X("L Max Force (N):Q", title="L Max Force (N)"),
-                y=alt.Y("R Max Force (N):Q", title="R Max Force (N)"),
-                tooltip=tooltip_cols
+        tooltip_cols = [c for c in tooltip_candidates if c in columnas]
+        scatter_df, binned = scatter_data("nordbord", version, filtros, "L Max Force (N)", "R Max Force (N)", tooltip_cols)
+        if binned:
+            # Demasiados puntos: se muestran celdas agregadas coloreadas por cantidad
+            chart = (
+                alt.Chart(scatter_df)
+                .mark_rect()
+                .encode(
+                    x=alt.X("x_ini:Q", title="L Max Force (N)"),
+                    x2="x_fin:Q",
+                    y=alt.Y("y_ini:Q", title="R Max Force (N)"),
+                    y2="y_fin:Q",
+                    color=alt.Color("Cantidad:Q", scale=alt.Scale(scheme="blues")),
+                    tooltip=["Cantidad"]
+                )
+            )
+        else:
+            chart = (
+                alt.Chart(scatter_df)
+                .mark_circle(size=60, color="#1f77b4")
+                .encode(
+                    x=alt.X("L Max Force (N):Q", title="L Max Force (N)"),
+                    y=alt.Y("R Max Force (N):Q", title="R Max Force (N)"),
+                    tooltip=tooltip_cols
+                )
+                .interactive()
             )
-            .interactive()
-        )
         st.altair_chart(chart, use_container_width=True)
 
-        st.download_button(
-            label="⬇️ Descargar NordBord CSV",
-            data=df.to_csv(index=False).encode("utf-8"),
-            file_name="all_nordbord.csv",
-            mime="text/csv",
-        )
+        download_menu("nordbord", version, filtros, "all_nordbord", "⬇️ Descargar NordBord", key="nb_descarga")
     except Exception as e:
         st.error(f"Error al leer el CSV: {e}")
 
 
 def show_forceframe():
     """Muestra los datos del archivo all_forceframe.csv"""
-    csv_path = "utils/output_data/all_forceframe.csv"
     st.header("🏋️‍♂️ Datos ForceFrame")
-    if not os.path.exists(csv_path):
-        st.warning("El archivo all_forceframe.csv no existe. Ejecuta la extracción primero.")
-        return
     try:
-        df_tests = pd.read_csv(csv_path)
-        profiles_path = "utils/output_data/all_profiles.csv"
-        if os.path.exists(profiles_path):
-            df_profiles = pd.read_csv(profiles_path)[["profileId","givenName","familyName","dateOfBirth","groupName"]]
-            df_merged = df_tests.merge(df_profiles, on="profileId", how="left")
-            # Mantener solo tests con perfil asociado completo
-            df = df_merged.dropna(subset=["givenName","familyName","dateOfBirth"])
-            if df.empty:
-                st.warning("No se encontraron tests con perfil asociado.")
-                return
-            df = df.rename(columns={"givenName":"Nombre","familyName":"Apellido","dateOfBirth":"Fecha de nacimiento"})
-            df["Fecha de nacimiento"] = pd.to_datetime(df["Fecha de nacimiento"]).dt.date
-            today = pd.to_datetime("today").date()
-            df["Edad"] = df["Fecha de nacimiento"].apply(lambda d: today.year - d.year - ((today.month, today.day) < (d.month, d.day)))
-            # ¿Hay filas con las tres columnas de perfil completas?
-            has_complete_profile = df_merged[["givenName","familyName","dateOfBirth"]].notna().all(axis=1).any()
-            if has_complete_profile:
-                df = df_merged.dropna(subset=["givenName","familyName","dateOfBirth"])
-                df = df.rename(columns={"givenName":"Nombre","familyName":"Apellido","dateOfBirth":"Fecha de nacimiento"})
-                df["Fecha de nacimiento"] = pd.to_datetime(df["Fecha de nacimiento"]).dt.date
-                today = pd.to_datetime("today").date()
-                df["Edad"] = df["Fecha de nacimiento"].apply(lambda d: today.year - d.year - ((today.month, today.day) < (d.month, d.day)))
-            else:
-                st.info("No se encontraron coincidencias de perfiles; se muestran todos los tests.")
-                df = df_tests
-        else:
-            df = df_tests
-        with st.expander(f"🗒️ Tabla completa ({len(df)} filas)"):
-            st.dataframe(df, use_container_width=True)
-        st.download_button(
-            label="⬇️ Descargar ForceFrame CSV",
-            data=df.to_csv(index=False).encode("utf-8"),
-            file_name="all_forceframe.csv",
-            mime="text/csv",
-        )
+        if not ensure_mart("forceframe"):
+            st.warning("El archivo all_forceframe.csv no existe. Ejecuta la extracción primero.")
+            return
+        if "Nombre" not in query.columns("forceframe"):
+            st.info("No se encontraron coincidencias de perfiles; se muestran todos los tests.")
+        show_paged_table("forceframe", {}, key="ff_tabla")
+        download_menu("forceframe", mart_version("forceframe"), {}, "all_forceframe", "⬇️ Descargar ForceFrame", key="ff_descarga")
     except Exception as e:
         st.error(f"Error al leer el CSV: {e}")
 
 def show_forcedecks():
     """Muestra los datos del archivo all_forcedecks.csv"""
-    csv_path = "utils/output_data/all_forcedecks.csv"
     st.header("🏋️‍♂️ Datos ForceDecks")
-    if not os.path.exists(csv_path):
-        st.warning("El archivo all_forcedecks.csv no existe. Ejecuta la extracción primero.")
-        return
     try:
-        df_tests = pd.read_csv(csv_path)
-        profiles_path = "utils/output_data/all_profiles.csv"
-        if os.path.exists(profiles_path):
-            df_profiles = pd.read_csv(profiles_path)[["profileId","givenName","familyName","dateOfBirth","groupName"]]
-            df_merged = df_tests.merge(df_profiles, on="profileId", how="left")
-            # Mantener solo tests con perfil asociado completo
-            df = df_merged.dropna(subset=["givenName","familyName","dateOfBirth"])
-            if df.empty:
-                st.warning("No se encontraron tests con perfil asociado.")
-                return
-            df = df.rename(columns={"givenName":"Nombre","familyName":"Apellido","dateOfBirth":"Fecha de nacimiento"})
-            df["Fecha de nacimiento"] = pd.to_datetime(df["Fecha de nacimiento"]).dt.date
-            today = pd.to_datetime("today").date()
-            df["Edad"] = df["Fecha de nacimiento"].apply(lambda d: today.year - d.year - ((today.month, today.day) < (d.month, d.day)))
-            # ¿Hay filas con las tres columnas de perfil completas?
-            has_complete_profile = df_merged[["givenName","familyName","dateOfBirth"]].notna().all(axis=1).any()
-            if has_complete_profile:
-                df = df_merged.dropna(subset=["givenName","familyName","dateOfBirth"])
-                df = df.rename(columns={"givenName":"Nombre","familyName":"Apellido","dateOfBirth":"Fecha de nacimiento"})
-                df["Fecha de nacimiento"] = pd.to_datetime(df["Fecha de nacimiento"]).dt.date
-                today = pd.to_datetime("today").date()
-                df["Edad"] = df["Fecha de nacimiento"].apply(lambda d: today.year - d.year - ((today.month, today.day) < (d.month, d.day)))
-            else:
-                st.info("No se encontraron coincidencias de perfiles; se muestran todos los tests.")
-                df = df_tests
-        else:
-            df = df_tests
-        with st.expander(f"🗒️ Tabla completa ({len(df)} filas)"):
-            st.dataframe(df, use_container_width=True)
-        st.download_button(
-            label="⬇️ Descargar ForceDecks CSV",
-            data=df.to_csv(index=False).encode("utf-8"),
-            file_name="all_forcedecks.csv",
-            mime="text/csv",
-        )
+        if not ensure_mart("forcedecks"):
+            st.warning("El archivo all_forcedecks.csv no existe. Ejecuta la extracción primero.")
+            return
+        if "Nombre" not in query.columns("forcedecks"):
+            st.info("No se encontraron coincidencias de perfiles; se muestran todos los tests.")
+        version = mart_version("forcedecks")
+        filtros = {}
+        facets = load_facets("forcedecks")
+        if "Jugador" in facets.columns():
+            grupos = facets.counts("Grupo")
+            test_types = facets.counts("testType")
+            col1, col2 = st.columns(2)
+            with col1:
+                sel_grupo = st.multiselect(
+                    "Plantel", options=list(grupos), default=[], key="fd_grupo",
+                    format_func=lambda g: f"{g} ({grupos[g]})",
+                )
+            with col2:
+                sel_tests = st.multiselect(
+                    "Tipo de test", options=list(test_types), default=[], key="fd_test",
+                    format_func=lambda t: f"{t} ({test_types[t]})",
+                )
+            filtros = {"Grupo": sel_grupo, "testType": sel_tests}
+            jugadores = facets.counts("Jugador", filtros)
+            filtros["Jugador"] = st.multiselect(
+                "Jugador", options=list(jugadores), default=[], key="fd_jugador",
+                format_func=lambda j: f"{j} ({jugadores[j]})",
+            )
+        show_paged_table("forcedecks", filtros, key="fd_tabla")
+
+        # Primero las métricas clave (las que tienen serie por atleta)
+        numeric_cols = [c for c in query.numeric_columns("forcedecks") if c not in NOT_METRICS]
+        trend = [c for c in MARTS["forcedecks"]["trend"] if c in numeric_cols]
+        numeric_cols = trend + [c for c in numeric_cols if c not in trend]
+        if numeric_cols and "Edad" in query.columns("forcedecks"):
+            var_sel = st.selectbox("Variable para analizar:", numeric_cols, index=0, key="fd_var")
+            show_norms("forcedecks", version, var_sel, filtros)
+
+        download_menu("forcedecks", version, filtros, "all_forcedecks", "⬇️ Descargar ForceDecks", key="fd_descarga")
     except Exception as e:
         st.error(f"Error al leer el CSV: {e}")
 
 
+def show_trends():
+    """Evolución de un atleta a partir de las series precalculadas."""
+    st.header("📈 Evolución por atleta")
+    try:
+        index = load_profile_index()
+        series = load_athlete_series()
+        if index is None or series is None:
+            st.warning("No hay tests procesados. Ejecuta la extracción primero.")
+            return
+        col1, col2 = st.columns(2)
+        with col2:
+            tabla = st.selectbox("Dispositivo", list(TREND_TABLES), format_func=TREND_TABLES.get, key="ev_tabla")
+        # Solo jugadores con series del dispositivo elegido
+        jugadores = sorted({index.get(pid)["Jugador"] for pid in series.profiles(tabla) if pid in index})
+        with col1:
+            jugador = st.selectbox("Jugador", jugadores, key="ev_jugador")
+        # Puede haber homónimos: se muestran juntos
+        ids = index.ids_for_name(jugador) if jugador else []
+        metricas = list(dict.fromkeys(m for pid in ids for m in series.metrics(pid, tabla)))
+        if not metricas:
+            st.info("El jugador no tiene tests de este dispositivo.")
+            return
+        metrica = st.selectbox("Métrica", metricas, key="ev_metrica")
+        df = pd.concat([series.get(pid, tabla, metrica) for pid in ids])
+
+        ultimo = df.iloc[-1]
+        st.metric(
+            f"Último test ({ultimo['Fecha Test']:%d/%m/%Y})",
+            f"{ultimo['Valor']:.2f}",
+            None if pd.isna(ultimo["Cambio"]) else f"{ultimo['Cambio']:+.2f} vs. test anterior",
+        )
+
+        # Valor de cada test, mejor y media de los últimos tests
+        chart_df = downsample_series(df, "Fecha Test", "Valor")[["Fecha Test", "Valor", "Mejor", "Media"]]
+        chart_df = chart_df.melt("Fecha Test", var_name="Serie", value_name=metrica)
+        chart = (
+            alt.Chart(chart_df)
+            .mark_line(point=True)
+            .encode(
+                x=alt.X("Fecha Test:T", title="Fecha"),
+                y=alt.Y(f"{metrica}:Q", title=metrica),
+                color=alt.Color("Serie:N", scale=alt.Scale(range=["#1f77b4", "#2ca02c", "#ff7f0e"])),
+                tooltip=["Fecha Test:T", "Serie", f"{metrica}:Q"],
+            )
+            .properties(height=350)
+            .interactive()
+        )
+        st.altair_chart(chart, use_container_width=True)
+        st.dataframe(
+            df[["Fecha Test", "Valor", "Mejor", "Media", "Cambio", "Cambio (%)"]].iloc[::-1],
+            use_container_width=True, column_config=COLUMN_CONFIG, hide_index=True,
+        )
+    except Exception as e:
+        st.error(f"Error al leer las series: {e}")
+
+
+def show_athlete():
+    """Vista 360 de un atleta: perfil e historial de tests de todos los dispositivos."""
+    st.header("🧍 Atleta 360")
+    try:
+        index = load_profile_index()
+        tests = load_test_index()
+        if index is None or tests is None:
+            st.warning("No hay tests procesados. Ejecuta la extracción primero.")
+            return
+        # Solo jugadores con algún test
+        con_tests = set(tests.profiles())
+        jugadores = sorted({index.get(pid)["Jugador"] for pid in con_tests if pid in index})
+        jugador = st.selectbox("Jugador", jugadores, key="a360_jugador")
+        if not jugador:
+            return
+        ids = index.ids_for_name(jugador)
+        perfil = index.get(ids[0])
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Plantel", perfil["Grupo"])
+        nacimiento = perfil["Fecha de nacimiento"]
+        col2.metric("Fecha de nacimiento", f"{nacimiento:%d/%m/%Y}" if pd.notna(nacimiento) else "-")
+        col3.metric("Edad", age_at(pd.Series([nacimiento])).iloc[0])
+
+        st.subheader("Tests por dispositivo")
+        st.dataframe(tests.summary(ids), use_container_width=True, hide_index=True, column_config={
+            "Primer test": st.column_config.DateColumn("Primer test"),
+            "Último test": st.column_config.DateColumn("Último test"),
+        })
+
+        historial = tests.history(ids)
+        timeline = (
+            alt.Chart(historial[["Fecha Test", "Dispositivo", "Test"]])
+            .mark_tick(thickness=3, size=20)
+            .encode(
+                x=alt.X("Fecha Test:T", title="Fecha"),
+                y=alt.Y("Dispositivo:N", title=None),
+                color=alt.Color("Test:N"),
+                tooltip=["Fecha Test:T", "Dispositivo", "Test"],
+            )
+            .properties(height=60 + 40 * historial["Dispositivo"].nunique())
+        )
+        st.altair_chart(timeline, use_container_width=True)
+
+        st.subheader(f"Historial completo ({len(historial)} tests)")
+        st.dataframe(historial, use_container_width=True, hide_index=True, column_config=COLUMN_CONFIG)
+
+        show_trace(historial)
+    except Exception as e:
+        st.error(f"Error al leer el historial: {e}")
+
+
+def show_trace(historial):
+    """Curva fuerza-tiempo de un test del historial (si se descargaron las trazas)."""
+    traces = load_traces()
+    if traces is None:
+        return
+    con_traza = historial[historial["testId"].astype(str).map(lambda t: bool(traces.get(t)))]
+    if con_traza.empty:
+        return
+    st.subheader("Curva fuerza-tiempo")
+    opciones = {
+        f"{row['Fecha Test']:%d/%m/%Y} · {row['Dispositivo']} · {row['Test']}": str(row["testId"])
+        for _, row in con_traza.iterrows()
+    }
+    etiqueta = st.selectbox("Test", list(opciones), key="a360_traza")
+    df = trace_data(traces, opciones[etiqueta])
+    long = df.melt("Tiempo (s)", var_name="Canal", value_name="Fuerza")
+    chart = (
+        alt.Chart(long)
+        .mark_line()
+        .encode(x="Tiempo (s):Q", y=alt.Y("Fuerza:Q", title="Fuerza (N)"), color="Canal:N")
+    )
+    st.altair_chart(chart, use_container_width=True)
+
+
 def show_profiles():
     """Muestra lista de perfiles"""
-    csv_path = "utils/output_data/all_profiles.csv"
     st.header("🧑‍💼 Perfiles")
-    if not os.path.exists(csv_path):
-        st.warning("El archivo all_profiles.csv no existe. Ejecuta la extracción primero.")
-        return
     try:
-        df = pd.read_csv(csv_path)[["groupName","givenName","familyName","dateOfBirth"]]
-        df = df.rename(columns={"groupName":"Plantel","givenName":"Nombre","familyName":"Apellido","dateOfBirth":"Fecha de nacimiento"})
-        df["Fecha de nacimiento"] = pd.to_datetime(df["Fecha de nacimiento"]).dt.date
-        today = pd.to_datetime("today").date()
-        df["Edad"] = df["Fecha de nacimiento"].apply(lambda d: today.year - d.year - ((today.month, today.day) < (d.month, d.day)))
-        df["Edad"] = df["Edad"].astype(int)
+        df = load_mart("profiles")
+        if df is None:
+            st.warning("El archivo all_profiles.csv no existe. Ejecuta la extracción primero.")
+            return
+        index = load_profile_index()
         # Filtro por Plantel
-        planteles = sorted(df["Plantel"].dropna().unique())
+        planteles = index.groups()
         seleccion = st.selectbox("Filtrar por plantel:", ["Todos"] + planteles, index=0)
         if seleccion != "Todos":
-            df = df[df["Plantel"] == seleccion]
+            df = df[df["profileId"].isin(index.ids_for_groups([seleccion]))]
+        # Búsqueda de jugadores (opciones y filas resueltas con el índice)
+        grupos = [seleccion] if seleccion != "Todos" else None
+        sel_jug = st.multiselect("Jugador", options=index.names(grupos), default=[], key="pf_jugador")
+        sel_ids = [pid for j in sel_jug for pid in index.ids_for_name(j)]
+        if sel_ids:
+            df = df[df["profileId"].isin(sel_ids)]
+        # La tabla es compartida entre sesiones: la edad se agrega sobre una vista nueva
+        df = df.assign(Edad=age_at(df["Fecha de nacimiento"]))
         # Order columns
         df = df[["Plantel","Nombre","Apellido","Fecha de nacimiento","Edad"]]
 
         # Gráfico: cantidad de perfiles por plantel
         chart_plantel = (
-            alt.Chart(df.groupby("Plantel").size().reset_index(name="Perfiles"))
+            alt.Chart(df.groupby("Plantel", observed=True).size().reset_index(name="Perfiles"))
             .mark_bar()
             .encode(
                 x=alt.X("Plantel:N", sort="-y"),
@@ -382,7 +572,7 @@ def show_profiles():
 
         # Gráfico: cantidad de jugadores por edad
         chart_edad = (
-            alt.Chart(df.groupby("Edad").size().reset_index(name="Jugadores"))
+            alt.Chart(df.groupby("Edad", observed=True).size().reset_index(name="Jugadores"))
             .mark_bar()
             .encode(
                 x=alt.X("Edad:O", sort="x"),
@@ -394,12 +584,14 @@ def show_profiles():
         st.altair_chart(chart_edad, use_container_width=True)
 
         st.write(f"{len(df)} perfiles cargados")
-        st.dataframe(df, use_container_width=True)
-        st.download_button(
-            label="⬇️ Descargar Perfiles CSV",
-            data=df.to_csv(index=False).encode("utf-8"),
-            file_name="perfiles.csv",
-            mime="text/csv",
+        offset, limit = pagination(len(df), key="pf_tabla")
+        st.dataframe(df.iloc[offset:offset + limit], use_container_width=True, column_config=COLUMN_CONFIG)
+        filtros = {"Plantel": [seleccion]} if seleccion != "Todos" else {}
+        if sel_ids:
+            filtros["profileId"] = sel_ids
+        download_menu(
+            "profiles", mart_version("profiles"), filtros, "perfiles", "⬇️ Descargar Perfiles",
+            key="pf_descarga", columns=["Plantel", "Nombre", "Apellido", "Fecha de nacimiento", "Edad"],
         )
     except Exception as e:
         st.error(f"Error al leer el CSV: {e}")
@@ -489,6 +681,8 @@ def main():
         "NordBord": show_nordbord,
         "Force Frame": show_forceframe,
         "Force Decks": show_forcedecks,
+        "Evolución": show_trends,
+        "Atleta 360": show_athlete,
         "Cerrar Sesión": logout,
     }
 
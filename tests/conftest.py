@@ -0,0 +1,6 @@
+# tests/conftest.py
+"""Los tests importan el paquete utils desde la raíz del repositorio."""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
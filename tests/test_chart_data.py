@@ -0,0 +1,25 @@
+# tests/test_chart_data.py
+import numpy as np
+import pytest
+
+from utils.chart_data import lttb
+
+
+@pytest.mark.parametrize("n_out", [3, 10, 500])
+def test_keeps_endpoints_and_returns_n_points(n_out):
+    x = np.arange(5000)
+    y = np.sin(x / 50) + np.random.default_rng(1).normal(0, 0.1, len(x))
+    idx = lttb(x, y, n_out)
+    assert len(idx) == n_out
+    assert idx[0] == 0 and idx[-1] == len(x) - 1
+    assert (np.diff(idx) > 0).all()
+
+
+def test_keeps_spike():
+    y = np.zeros(1000)
+    y[637] = 10
+    assert 637 in lttb(np.arange(1000), y, 20)
+
+
+def test_short_series_unchanged():
+    assert lttb([0, 1, 2], [5, 6, 7], 10).tolist() == [0, 1, 2]
@@ -0,0 +1,57 @@
+# tests/test_devices.py
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from utils import devices
+
+
+def _response(items):
+    if not items:
+        return SimpleNamespace(status_code=204, content=b"", text="")
+    content = json.dumps(items).encode()
+    return SimpleNamespace(status_code=200, content=content, text=content.decode())
+
+
+def test_iter_pages_follows_last_record_cursor(monkeypatch):
+    # Tres registros por página; cada uno trae un objeto anidado con otra fecha
+    records = [
+        {"testId": str(i), "modifiedDateUtc": f"2024-01-01T00:00:{i:02d}.000Z",
+         "history": {"modifiedDateUtc": "1999-01-01T00:00:00.000Z"}}
+        for i in range(7)
+    ]
+    cursors = []
+
+    def get(url, token, params=None):
+        cursors.append(params["modifiedFromUtc"])
+        page = [r for r in records if r["modifiedDateUtc"] > params["modifiedFromUtc"]][:3]
+        return _response(page)
+
+    monkeypatch.setattr(devices.http, "get", get)
+    pages = list(devices.iter_pages("nordbord", "tok", "ten", "2020-01-01T00:00:00.000Z"))
+    ids = [r["testId"] for page in pages for r in devices.jsonio.decode_page(page, devices.ITEM_KEYS)]
+    assert ids == [str(i) for i in range(7)]
+    assert cursors == [
+        "2020-01-01T00:00:00.000Z",
+        "2024-01-01T00:00:02.000Z",
+        "2024-01-01T00:00:05.000Z",
+        "2024-01-01T00:00:06.000Z",
+    ]
+
+
+def test_next_cursor_advances_on_repeated_date():
+    assert devices.next_cursor("2024-01-01T00:00:00.000Z", "2024-01-01T00:00:00.000Z") == "2024-01-01T00:00:00.001Z"
+    assert devices.next_cursor("2024-01-02T00:00:00.000Z", "2024-01-01T00:00:00.000Z") == "2024-01-02T00:00:00.000Z"
+
+
+def test_default_devices_skip_unverified():
+    names = devices.default_devices()
+    assert {"nordbord", "forceframe", "forcedecks"} <= set(names)
+    assert "smartspeed" not in names and "humantrak" not in names
+
+
+def test_default_devices_from_env_value():
+    assert devices.default_devices("nordbord, SmartSpeed") == ["nordbord", "smartspeed"]
+    with pytest.raises(ValueError):
+        devices.default_devices("nordbord,otro")
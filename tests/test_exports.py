@@ -0,0 +1,43 @@
+# tests/test_exports.py
+import io
+
+import pandas as pd
+import pytest
+
+from utils.exports import file_bytes, frame_bytes
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        "Jugador": ["A", "B"],
+        "testDateUtc": pd.to_datetime(["2024-01-01T10:00:00Z", "2024-06-01T12:30:00Z"]).as_unit("us"),
+        "recordedDateUtc": pd.to_datetime(["2024-01-01T07:00:00-03:00", None], utc=True).tz_convert("Etc/UTC"),
+        "Valor": [1.5, 2.0],
+    })
+
+
+def test_excel_with_timezones(df):
+    pytest.importorskip("openpyxl")
+    back = pd.read_excel(io.BytesIO(frame_bytes(df, "Excel")))
+    assert back["testDateUtc"].tolist() == [pd.Timestamp("2024-01-01 10:00"), pd.Timestamp("2024-06-01 12:30")]
+    assert back["recordedDateUtc"].iloc[0] == pd.Timestamp("2024-01-01 10:00")
+    assert df["testDateUtc"].dt.tz is not None
+
+
+@pytest.mark.parametrize("fmt", ["CSV", "Parquet"])
+def test_other_formats_keep_timezones(df, fmt):
+    content = frame_bytes(df, fmt)
+    if fmt == "CSV":
+        assert b"2024-01-01 10:00:00+00:00" in content
+    else:
+        assert pd.read_parquet(io.BytesIO(content))["testDateUtc"].dt.tz is not None
+
+
+def test_file_bytes_serves_csv_as_is(tmp_path):
+    path = tmp_path / "all_x.csv"
+    path.write_bytes(b"a,b\n1,x\n2,y\n")
+    version = path.stat().st_mtime_ns
+    assert file_bytes(str(path), version, "CSV") == path.read_bytes()
+    back = pd.read_parquet(io.BytesIO(file_bytes(str(path), version, "Parquet")))
+    assert back["b"].tolist() == ["x", "y"]
@@ -0,0 +1,73 @@
+# tests/test_fileio.py
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+
+import pytest
+
+from utils.fileio import atomic_write, file_lock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_atomic_write_uses_unique_temp_names(tmp_path):
+    path = tmp_path / "x.parquet"
+    with atomic_write(path) as first, atomic_write(path) as second:
+        assert first != second and first.parent == path.parent
+        first.write_text("uno")
+        second.write_text("dos")
+    assert path.read_text() == "uno"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["x.parquet"]
+
+
+def test_atomic_write_keeps_target_on_error(tmp_path):
+    path = tmp_path / "x.json"
+    path.write_text("viejo")
+    with pytest.raises(RuntimeError):
+        with atomic_write(path) as tmp:
+            tmp.write_text("nuevo")
+            raise RuntimeError
+    assert path.read_text() == "viejo"
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_file_lock_serializes_threads(tmp_path):
+    inside, overlaps = [], []
+
+    def work():
+        with file_lock(tmp_path / "build.lock"):
+            if inside:
+                overlaps.append(True)
+            inside.append(True)
+            time.sleep(0.05)
+            inside.pop()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not overlaps
+
+
+def test_file_lock_waits_for_other_process(tmp_path):
+    code = textwrap.dedent(f"""
+        import sys, time
+        sys.path.insert(0, {ROOT!r})
+        from utils.fileio import file_lock
+        with file_lock({str(tmp_path / "build.lock")!r}):
+            print("ok", flush=True)
+            time.sleep(0.5)
+    """)
+    proc = subprocess.Popen([sys.executable, "-c", code], stdout=subprocess.PIPE, text=True)
+    try:
+        assert proc.stdout.readline().strip() == "ok"
+        t0 = time.monotonic()
+        with file_lock(tmp_path / "build.lock"):
+            waited = time.monotonic() - t0
+        assert waited > 0.2
+    finally:
+        proc.wait()
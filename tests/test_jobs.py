@@ -0,0 +1,70 @@
+# tests/test_jobs.py
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+
+from utils.jobs import DONE, INTERRUPTED, Job
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _noop(log_cb, progress_cb):
+    progress_cb(1, 1, "ok")
+
+
+def _wait(job, timeout=10):
+    deadline = time.monotonic() + timeout
+    while job.is_running() and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+
+def test_stale_lock_file_does_not_block(tmp_path):
+    # Lock y estado que dejó un proceso que ya no existe (pid reutilizado: 1 está vivo)
+    (tmp_path / "x.lock").write_text("1@otro-host")
+    (tmp_path / "x.json").write_text('{"state": "running", "log": []}')
+    job = Job("x", _noop, tmp_path)
+    assert not job.is_running()
+    assert job.status()["state"] == INTERRUPTED
+    state, started = job.start()
+    assert started
+    _wait(job)
+    assert job.status()["state"] == DONE
+
+
+def test_lock_is_single_flight(tmp_path):
+    release = threading.Event()
+    holder = Job("x", lambda log_cb, progress_cb: release.wait(10), tmp_path)
+    state, started = holder.start()
+    assert started
+    other = Job("x", _noop, tmp_path)
+    assert other.is_running()
+    state_other, started_other = other.start()
+    assert not started_other and state_other["id"] == state["id"]
+    release.set()
+    _wait(holder)
+    assert holder.status()["state"] == DONE
+
+
+def test_lock_of_killed_process_is_released(tmp_path):
+    code = textwrap.dedent(f"""
+        import sys, time
+        sys.path.insert(0, {ROOT!r})
+        from utils.jobs import Job
+        Job("x", lambda log_cb, progress_cb: time.sleep(60), {str(tmp_path)!r}).start()
+        print("ok", flush=True)
+        time.sleep(60)
+    """)
+    proc = subprocess.Popen([sys.executable, "-c", code], stdout=subprocess.PIPE, text=True)
+    try:
+        assert proc.stdout.readline().strip() == "ok"
+        job = Job("x", _noop, tmp_path)
+        assert job.is_running()
+        assert not job.run()[1]
+    finally:
+        proc.kill()
+        proc.wait()
+    assert not job.is_running()
+    assert job.run()[1]
@@ -0,0 +1,40 @@
+# tests/test_jsonio.py
+import pytest
+
+from utils import jsonio
+
+FIELDS = ["modifiedDateUtc", "modifiedDate"]
+ITEM_KEYS = ["tests", "items", "data"]
+
+
+def test_decode_page_shapes():
+    assert jsonio.decode_page(b'[{"a": 1}, {"a": 2}]') == [{"a": 1}, {"a": 2}]
+    assert jsonio.decode_page(b'{"items": [{"a": 1}]}', ITEM_KEYS) == [{"a": 1}]
+    assert jsonio.decode_page(b'{"a": 1}', ITEM_KEYS) == [{"a": 1}]
+
+
+def test_decode_empty_page():
+    assert jsonio.decode_page(b"") == []
+    assert jsonio.decode_page(b"[]") == []
+
+
+@pytest.mark.parametrize("content, expected", [
+    (b'[{"modifiedDateUtc": "A"}, {"modifiedDateUtc": "B", "x": {"y": [1]}}]', "B"),
+    (b'{"tests": [{"modifiedDateUtc": "A"}, {"modifiedDateUtc": "B"}]}', "B"),
+    # Misma clave en un objeto anidado del último registro
+    (b'[{"modifiedDateUtc": "A"}, {"modifiedDateUtc": "B", "h": {"modifiedDateUtc": "Z"}}]', "B"),
+    (b'[{"modifiedDateUtc": "B", "h": [{"modifiedDateUtc": "Z"}]}]', "B"),
+    # Comillas escapadas y llaves dentro de textos
+    (b'[{"modifiedDateUtc": "A"}, {"notes": "a \\"}\\" b", "modifiedDateUtc": "B"}]', "B"),
+    (b'[{"modifiedDateUtc": "B", "notes": "}]"}]', "B"),
+    (b'[{"modifiedDateUtc": "2024-01-01T00:00:00\\u002e000Z"}]', "2024-01-01T00:00:00.000Z"),
+    # Último registro sin fecha: la del último que la tiene
+    (b'[{"modifiedDateUtc": "A"}, {"modifiedDateUtc": null}]', "A"),
+    (b'{"tests": [{"modifiedDateUtc": "B"}], "meta": {"modifiedDateUtc": "Z"}}', "B"),
+    # Campo alternativo
+    (b'[{"modifiedDate": "A"}, {"modifiedDate": "B"}]', "B"),
+    (b'[]', None),
+    (b'', None),
+])
+def test_last_string(content, expected):
+    assert jsonio.last_string(content, FIELDS, ITEM_KEYS) == expected
@@ -0,0 +1,15 @@
+# tests/test_longitudinal.py
+import pandas as pd
+
+from utils.longitudinal import AthleteSeries
+
+
+def test_profiles_by_table():
+    series = AthleteSeries(pd.DataFrame({
+        "profileId": ["a", "a", "b", "c"],
+        "Tabla": ["nordbord", "forcedecks", "nordbord", "forcedecks"],
+        "Métrica": ["m"] * 4,
+    }))
+    assert sorted(series.profiles()) == ["a", "b", "c"]
+    assert sorted(series.profiles("nordbord")) == ["a", "b"]
+    assert series.profiles("forceframe") == []
@@ -0,0 +1,27 @@
+# tests/test_normalize.py
+import pandas as pd
+
+from utils.normalize import parse_offsets
+
+
+def test_legacy_1969_strings_become_minutes():
+    df = pd.DataFrame({
+        "recordedDateOffset": ["1969-12-31 23:59:59.999999820", "1970-01-01 00:00:00.000000060", "1970-01-01"],
+    })
+    parse_offsets(df, ["recordedDateOffset"])
+    assert str(df["recordedDateOffset"].dtype) == "Int16"
+    assert df["recordedDateOffset"].tolist() == [-180, 60, 0]
+
+
+def test_mixed_numeric_legacy_and_missing():
+    df = pd.DataFrame({"analysedDateOffset": ["-180", "1969-12-31 23:59:59.999999820", None]})
+    parse_offsets(df, ["analysedDateOffset", "missing"])
+    assert df["analysedDateOffset"].tolist()[:2] == [-180, -180]
+    assert df["analysedDateOffset"].isna().iloc[2]
+
+
+def test_numeric_column_is_cast():
+    df = pd.DataFrame({"recordedDateOffset": [-180.0, 120.0]})
+    parse_offsets(df, ["recordedDateOffset"])
+    assert df["recordedDateOffset"].tolist() == [-180, 120]
+    assert str(df["recordedDateOffset"].dtype) == "Int16"
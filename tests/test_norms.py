@@ -0,0 +1,53 @@
+# tests/test_norms.py
+import numpy as np
+import pytest
+
+from utils.norms import TDigest
+
+
+@pytest.fixture
+def values():
+    return np.random.default_rng(0).normal(1000, 150, 20_000)
+
+
+@pytest.mark.parametrize("q", [0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99])
+def test_quantile_close_to_exact(values, q):
+    digest = TDigest.from_values(values)
+    spread = values.max() - values.min()
+    assert abs(digest.quantile(q) - np.quantile(values, q)) < 0.01 * spread
+
+
+def test_extremes_are_exact(values):
+    digest = TDigest.from_values(values)
+    assert digest.quantile(0) == values.min()
+    assert digest.quantile(1) == values.max()
+
+
+def test_centroids_are_bounded(values):
+    digest = TDigest.from_values(values)
+    assert digest.count == len(values)
+    assert len(digest.means) <= digest.compression
+
+
+def test_merge_matches_single_digest(values):
+    whole = TDigest.from_values(values)
+    merged = TDigest.from_values(values[:5000])
+    for chunk in np.array_split(values[5000:], 3):
+        merged.merge(TDigest.from_values(chunk))
+    assert merged.count == whole.count
+    assert (merged.min, merged.max) == (whole.min, whole.max)
+    spread = values.max() - values.min()
+    for q in (0.05, 0.5, 0.95):
+        assert abs(merged.quantile(q) - whole.quantile(q)) < 0.01 * spread
+
+
+def test_percentile_of_inverts_quantile(values):
+    digest = TDigest.from_values(values)
+    assert digest.percentile_of(digest.quantile(0.3)) == pytest.approx(30, abs=0.5)
+
+
+def test_empty_digest():
+    digest = TDigest.from_values([np.nan])
+    assert np.isnan(digest.quantile(0.5))
+    assert np.isnan(digest.percentile_of(1.0))
+    assert digest.merge(TDigest()).count == 0
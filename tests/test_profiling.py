@@ -0,0 +1,48 @@
+# tests/test_profiling.py
+import threading
+import time
+
+import pytest
+
+from utils import profiling
+
+
+@pytest.fixture
+def cpu_mode():
+    profiling.configure("cpu")
+    yield
+    profiling.configure("0")
+
+
+def test_concurrent_cpu_profiles(tmp_path, cpu_mode):
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def stage():
+        try:
+            with profiling.profile("etapa", tmp_path):
+                started.set()
+                release.wait(10)
+        except Exception as e:
+            errors.append(e)
+
+    @profiling.profiled
+    def loader():
+        time.sleep(profiling.LOADER_MIN_SECONDS * 2)
+        return 42
+
+    profiling.profiles_dir, original = (lambda output_dir=None: tmp_path), profiling.profiles_dir
+    try:
+        thread = threading.Thread(target=stage)
+        thread.start()
+        assert started.wait(10)
+        # El loader corre mientras la etapa perfila cpu: no falla y no se perfila
+        assert loader() == 42
+        release.set()
+        thread.join()
+        assert loader() == 42
+    finally:
+        profiling.profiles_dir = original
+    assert not errors
+    assert (tmp_path / "etapa.prof").exists()
+    assert len(list((tmp_path / "dashboard").glob("*_loader.prof"))) == 1
@@ -0,0 +1,121 @@
+# utils/aggregates.py
+"""
+Agregados precalculados por tabla, tipo de test, plantel, edad y fecha.
+
+Para cada combinación (tabla, test, plantel, edad, día) y cada métrica se
+guardan N, suma, mínimo y máximo. Son combinables: los tests nuevos de una
+sincronización se agregan por separado y se suman a los buckets existentes,
+y las vistas filtradas (por fecha, plantel, test o edad) se responden
+combinando buckets sin recorrer los tests.
+
+Min y Max no se pueden descontar: si un test ya agregado cambia, los buckets
+donde estaba y donde quedó se recalculan desde la tabla. El mantenimiento
+incremental (qué tests ya están agregados, con qué huella y en qué bucket)
+vive en utils/mart.py junto con la construcción de las tablas.
+"""
+import numpy as np
+import pandas as pd
+
+# Dimensiones de cada bucket (la fecha es el día del test)
+KEYS = ["Test", "Grupo", "Edad", "Fecha Test"]
+
+# Columnas numéricas que no son métricas (edad y offsets de zona horaria)
+NOT_METRICS = ["Edad", "recordedDateOffset", "analysedDateOffset"]
+
+
+def metric_columns(df):
+    """Columnas numéricas de una tabla que se agregan como métricas."""
+    return [c for c in df.select_dtypes(include="number").columns if c not in NOT_METRICS]
+
+
+def bucket_keys(df, test_column):
+    """Bucket (KEYS) de cada test de una tabla ya enriquecida, con el mismo índice."""
+    def _col(col, dtype):
+        if col in df.columns:
+            return df[col].astype(dtype)
+        return pd.Series(pd.NA, index=df.index, dtype=dtype)
+
+    return pd.DataFrame({
+        "Test": _col(test_column, "string"),
+        "Grupo": _col("Grupo", "string"),
+        "Edad": _col("Edad", "Int64"),
+        "Fecha Test": df["Fecha Test"],
+    }, index=df.index)
+
+
+def in_buckets(keys, buckets):
+    """Máscara de las filas de `keys` que caen en alguno de `buckets` (mismas columnas)."""
+    if keys is None or buckets.empty:
+        return np.zeros(0 if keys is None else len(keys), dtype=bool)
+    on = list(buckets.columns)
+    hits = buckets.drop_duplicates().assign(_hit=True)
+    return keys[on].merge(hits, on=on, how="left")["_hit"].notna().to_numpy()
+
+
+def partial_aggregates(name, df, test_column):
+    """N, Suma, Min y Max por bucket y métrica de un lote de tests ya enriquecidos."""
+    metrics = metric_columns(df)
+    keys = bucket_keys(df, test_column)
+    values = df[metrics].astype("float64")
+    long = pd.concat([keys, values], axis=1).melt(id_vars=KEYS, var_name="Métrica", value_name="Valor")
+    long = long.dropna(subset=["Valor"])
+    out = (
+        long.groupby(KEYS + ["Métrica"], dropna=False, observed=True)["Valor"]
+        .agg(N="count", Suma="sum", Min="min", Max="max")
+        .reset_index()
+    )
+    out.insert(0, "Tabla", name)
+    return out
+
+
+def merge_aggregates(*frames):
+    """Combina tablas de agregados: N y Suma se suman, Min y Max se combinan."""
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames:
+        return None
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    return (
+        pd.concat(frames, ignore_index=True)
+        .groupby(["Tabla"] + KEYS + ["Métrica"], dropna=False, observed=True)
+        .agg(N=("N", "sum"), Suma=("Suma", "sum"), Min=("Min", "min"), Max=("Max", "max"))
+        .reset_index()
+    )
+
+
+def covers(filters):
+    """True si los filtros activos se pueden responder solo con los buckets."""
+    for col, value in (filters or {}).items():
+        if value is None or (not isinstance(value, tuple) and not len(value)):
+            continue
+        if col not in KEYS:
+            return False
+    return True
+
+
+def summary(path, name, by, metric, filters=None):
+    """
+    Min/Max/Media/N de `metric` agrupado por `by` combinando buckets, y la
+    media global. Mismo formato que utils/query.aggregate + query.mean.
+    """
+    df = pd.read_parquet(path, filters=[("Tabla", "==", name), ("Métrica", "==", metric)])
+    for col, value in (filters or {}).items():
+        if value is None:
+            continue
+        if isinstance(value, tuple):
+            _, desde, hasta = value
+            if desde is not None and hasta is not None:
+                df = df[df[col].between(pd.Timestamp(desde), pd.Timestamp(hasta))]
+        elif len(value):
+            df = df[df[col].isin(list(value))]
+
+    grouped = (
+        df.groupby(by, dropna=False, observed=True)
+        .agg(Min=("Min", "min"), Max=("Max", "max"), Suma=("Suma", "sum"), N=("N", "sum"))
+        .reset_index()
+        .sort_values(by)
+    )
+    grouped["Media"] = grouped["Suma"] / grouped["N"]
+    total = df["N"].sum()
+    overall_mean = df["Suma"].sum() / total if total else None
+    return grouped[[by, "Min", "Max", "Media", "N"]].reset_index(drop=True), overall_mean
@@ -0,0 +1,50 @@
+# utils/athlete_index.py
+"""
+Índice unificado de tests de todos los dispositivos.
+
+Una fila por test (profileId, dispositivo, tipo de test, fecha y métricas
+clave) ordenada por atleta y fecha. La tabla se arma en cada sincronización
+(utils/mart.py) y acá se indexa por profileId: el historial completo de un
+atleta en todos los dispositivos es una búsqueda, sin cruzar tablas.
+"""
+import numpy as np
+import pandas as pd
+
+INDEX_COLUMNS = ["profileId", "testId", "Dispositivo", "Test", "Fecha Test"]
+
+
+class TestIndex:
+    """Tests de todos los dispositivos indexados por profileId."""
+
+    def __init__(self, df):
+        self._df = df.reset_index(drop=True)
+        self._by_profile = {key: np.asarray(pos) for key, pos in self._df.groupby("profileId").indices.items()}
+
+    def __len__(self):
+        return len(self._df)
+
+    def profiles(self):
+        """profileIds con al menos un test."""
+        return list(self._by_profile)
+
+    def history(self, profile_ids):
+        """Todos los tests de los atletas (uno o varios profileId), del más reciente al más antiguo."""
+        if isinstance(profile_ids, str):
+            profile_ids = [profile_ids]
+        pos = [self._by_profile[p] for p in profile_ids if p in self._by_profile]
+        if not pos:
+            return self._df.iloc[0:0]
+        df = self._df.iloc[np.concatenate(pos)]
+        # Solo las métricas que tiene algún test del atleta
+        return df.dropna(axis=1, how="all").sort_values("Fecha Test", ascending=False)
+
+    def summary(self, profile_ids):
+        """Cantidad de tests, primera y última fecha por dispositivo."""
+        df = self.history(profile_ids)
+        if df.empty:
+            return pd.DataFrame(columns=["Dispositivo", "Tests", "Primer test", "Último test"])
+        return (
+            df.groupby("Dispositivo", observed=True)
+            .agg(Tests=("testId", "count"), **{"Primer test": ("Fecha Test", "min"), "Último test": ("Fecha Test", "max")})
+            .reset_index()
+        )
@@ -0,0 +1,138 @@
+# utils/chart_data.py
+"""
+Preparación de datos para los gráficos Altair del dashboard.
+
+Los gráficos nunca reciben la tabla completa: por debajo de MAX_POINTS se
+envían los puntos tal cual, por encima se agregan en el servidor (binning 2D
+en rectángulos para dispersión, LTTB para series temporales). Los resúmenes
+por grupo salen de los agregados precalculados cuando los filtros lo permiten.
+Los resultados se cachean por tabla, versión y estado de los filtros.
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils import aggregates, norms, query
+from utils.data_loader import load_norms
+from utils.mart import aggregates_path
+
+# Límite por defecto de filas que Altair acepta embebidas en un gráfico
+MAX_POINTS = 5000
+
+# Cantidad de rectángulos por eje en el binning 2D
+BINS_2D = 40
+
+
+def bin_2d(x, y, bins=BINS_2D):
+    """
+    Agrupa pares (x, y) en una grilla de bins x bins y devuelve solo las
+    celdas con datos: x_ini, x_fin, y_ini, y_fin, Cantidad.
+    """
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    valid = ~(np.isnan(x) | np.isnan(y))
+    counts, x_edges, y_edges = np.histogram2d(x[valid], y[valid], bins=bins)
+    ix, iy = np.nonzero(counts)
+    return pd.DataFrame({
+        "x_ini": x_edges[ix],
+        "x_fin": x_edges[ix + 1],
+        "y_ini": y_edges[iy],
+        "y_fin": y_edges[iy + 1],
+        "Cantidad": counts[ix, iy].astype("int64"),
+    })
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: índices de los n_out puntos que mejor
+    conservan la forma visual de la serie (x debe estar ordenado).
+    """
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    # Los puntos internos se reparten en n_out - 2 buckets de igual tamaño
+    every = (n - 2) / (n_out - 2)
+    a = 0
+    for i in range(n_out - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        # Promedio del bucket siguiente como tercer vértice del triángulo
+        nxt_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[end:nxt_end].mean()
+        avg_y = y[end:nxt_end].mean()
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        idx[i + 1] = a
+    return idx
+
+
+def downsample_series(df, x, y, max_points=MAX_POINTS):
+    """Serie temporal ordenada por x, reducida con LTTB si supera max_points."""
+    df = df.dropna(subset=[x, y]).sort_values(x)
+    if len(df) <= max_points:
+        return df
+    xs = df[x].to_numpy()
+    if np.issubdtype(xs.dtype, np.datetime64):
+        xs = xs.astype("datetime64[ns]").astype("int64")
+    return df.iloc[lttb(xs, df[y].to_numpy(), max_points)]
+
+
+def trace_data(traces, test_id, max_points=MAX_POINTS):
+    """
+    Curva fuerza-tiempo de un test (utils/traces.py): tiempo en segundos y un
+    canal por columna. Por encima de max_points se conserva la unión de los
+    puntos LTTB de cada canal; solo esas muestras se copian de la traza.
+    """
+    channels = traces.get(test_id)
+    if not channels:
+        return pd.DataFrame()
+    n = min(len(v) for v in channels.values())
+    x = np.arange(n) / traces.sample_rate(test_id)
+    if n > max_points:
+        per_channel = max(3, max_points // len(channels))
+        keep = np.unique(np.concatenate([lttb(x, v[:n], per_channel) for v in channels.values()]))
+    else:
+        keep = np.arange(n)
+    df = pd.DataFrame({"Tiempo (s)": x[keep]})
+    for channel, values in channels.items():
+        df[channel] = values[keep]
+    return df
+
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def scatter_data(name, version, filters, x, y, tooltip, max_points=MAX_POINTS):
+    """
+    Datos para la dispersión x vs y con los filtros aplicados.
+    Devuelve (DataFrame, binned): si binned es True son celdas de bin_2d.
+    `version` solo forma parte de la clave de la caché.
+    """
+    cols = list(dict.fromkeys([x, y] + list(tooltip)))
+    df = query.select(name, filters, columns=cols)
+    if len(df) <= max_points:
+        return df, False
+    return bin_2d(df[x], df[y]), True
+
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def summary_by(name, version, filters, by, metric):
+    """Min/Max/Media/N de `metric` por `by` y la media global (cacheado)."""
+    # Con filtros solo por dimensiones de bucket no hace falta recorrer los tests
+    if by in aggregates.KEYS and aggregates.covers(filters) and aggregates_path().exists():
+        return aggregates.summary(aggregates_path(), name, by, metric, filters)
+    return query.aggregate(name, by, metric, filters), query.mean(name, metric, filters)
+
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def norm_bands(name, version, metric, filters):
+    """Percentiles P10-P90 de `metric` por edad a partir de los digests normativos."""
+    digests = load_norms()
+    if digests is None:
+        return pd.DataFrame(columns=["Edad", "N"] + [f"P{p}" for p in norms.BANDS])
+    return norms.bands(digests, name, metric, "Edad", filters)
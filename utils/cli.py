@@ -0,0 +1,145 @@
+# utils/cli.py
+"""
+Línea de comandos del extractor (sin Streamlit).
+
+    python -m utils.cli run [--mode full|incremental|backfill] [--since FECHA]
+                            [--device NOMBRE ...] [--tenant ID_O_NOMBRE ... | --all-tenants]
+                            [--workers N] [--process-workers N] [--no-sheets]
+                            [--log-level DEBUG|INFO|WARNING|ERROR] [--profile [cpu,sample,mem]]
+    python -m utils.cli schedule [--interval MIN] [--jitter SEG] [...mismas opciones]
+
+`run` hace una extracción y termina. `schedule` queda corriendo y hace una
+sincronización incremental cada `interval` minutos (más un retardo
+aleatorio de hasta `jitter` segundos, para que varias instancias no peguen a
+la API al mismo tiempo). Ambos usan el mismo lock que el botón del dashboard
+(utils/jobs.py): si ya hay una extracción en curso, la corrida se saltea.
+"""
+import argparse
+import random
+import signal
+import sys
+import threading
+from pathlib import Path
+
+# Ejecución directa (python utils/cli.py): exponer el paquete utils
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import http, logs, profiling
+from utils.devices import DEVICES, PROCESS_WORKERS, default_devices
+from utils.extractor import MODES, run_extraction_with_realtime_logs
+from utils.jobs import DONE, Job
+
+# Minutos entre sincronizaciones y retardo aleatorio máximo (segundos) del daemon
+DEFAULT_INTERVAL = 60
+DEFAULT_JITTER = 120
+
+log = logs.get_logger("cli")
+
+
+def _add_extraction_args(parser):
+    parser.add_argument("--device", dest="devices", action="append", choices=list(DEVICES),
+                        help="Dispositivo a extraer (repetible; por defecto VALD_DEVICES o los verificados: "
+                             + ", ".join(default_devices()) + ")")
+    tenants = parser.add_mutually_exclusive_group()
+    tenants.add_argument("--tenant", dest="tenants", action="append",
+                         help="Tenant por id o nombre (repetible; por defecto el primero)")
+    tenants.add_argument("--all-tenants", dest="tenants", action="store_const", const="all",
+                         help="Extraer todos los tenants")
+    parser.add_argument("--workers", type=int, default=http.MAX_WORKERS,
+                        help="Descargas concurrentes (hilos)")
+    parser.add_argument("--process-workers", type=int, default=PROCESS_WORKERS,
+                        help="Procesos para transformar páginas (0 = sin pool)")
+    parser.add_argument("--no-sheets", dest="sheets", action="store_false",
+                        help="No subir los resultados a Google Sheets")
+    parser.add_argument("--log-level", choices=logs.LEVELS, help="Nivel mínimo de log (por defecto VALD_LOG_LEVEL o INFO)")
+    parser.add_argument("--profile", nargs="?", const="all", metavar="MODOS",
+                        help="Perfilar cada etapa: cpu, sample y/o mem separados por coma (sin valor, todos; "
+                             "por defecto VALD_PROFILE)")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m utils.cli", description="Extracción de datos de VALD")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Una extracción y termina")
+    run.add_argument("--mode", choices=MODES, default="full",
+                     help="full: todo, reemplaza archivos; incremental: desde el último test guardado; "
+                          "backfill: desde --since, agregando sobre lo guardado")
+    run.add_argument("--since", help="Fecha ISO 8601 desde la que extraer (por defecto FECHA_DESDE)")
+    _add_extraction_args(run)
+
+    schedule = commands.add_parser("schedule", help="Sincronización incremental periódica")
+    schedule.add_argument("--interval", type=float, default=DEFAULT_INTERVAL,
+                          help="Minutos entre el fin de una sincronización y la siguiente")
+    schedule.add_argument("--jitter", type=float, default=DEFAULT_JITTER,
+                          help="Retardo aleatorio máximo (segundos) agregado a cada espera")
+    schedule.add_argument("--no-initial-run", dest="initial_run", action="store_false",
+                          help="Esperar un intervalo antes de la primera sincronización")
+    _add_extraction_args(schedule)
+    return parser
+
+
+def extraction_job(args, mode, since=None):
+    """Job (utils/jobs.py) con la extracción configurada por la línea de comandos."""
+    def target(log_cb, progress_cb):
+        run_extraction_with_realtime_logs(
+            log_cb, progress_cb, mode=mode, since=since, devices=args.devices,
+            tenants=args.tenants, max_workers=args.workers, process_workers=args.process_workers,
+            sheets=args.sheets,
+        )
+    return Job("extraction", target)
+
+
+def run_once(args, mode, since=None):
+    """Corre una extracción. 0 si terminó bien, 1 si falló, 2 si ya había otra en curso."""
+    state, ran = extraction_job(args, mode, since).run()
+    if not ran:
+        log.warning(f"⏭️ Ya hay una extracción en curso (iniciada {state.get('started')}, pid {state.get('pid')})")
+        return 2
+    if state["state"] != DONE:
+        log.error(f"❌ Extracción con error: {state.get('error')}")
+        return 1
+    return 0
+
+
+def schedule(args):
+    """Sincronizaciones incrementales hasta recibir SIGINT/SIGTERM."""
+    stop = threading.Event()
+
+    def _stop(signum, frame):
+        log.info("🛑 Deteniendo el sincronizador (se termina la corrida en curso)...")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    log.info(f"⏰ Sincronización incremental cada {args.interval:g} min (+ hasta {args.jitter:g} s)")
+    delay = 0 if args.initial_run else args.interval * 60 + random.uniform(0, args.jitter)
+    while not stop.wait(delay):
+        try:
+            run_once(args, "incremental")
+        except Exception as e:
+            # Un error no detiene el daemon: se reintenta en la próxima vuelta
+            log.exception(f"❌ Error en la sincronización: {e}")
+        delay = args.interval * 60 + random.uniform(0, args.jitter)
+    return 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logs.configure(args.log_level, console=True)
+    if args.profile is not None:
+        try:
+            profiling.configure(args.profile)
+        except ValueError as e:
+            build_parser().error(str(e))
+    if args.command == "schedule":
+        return schedule(args)
+    if args.mode == "backfill" and not args.since:
+        build_parser().error("--mode backfill requiere --since")
+    return run_once(args, args.mode, args.since)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
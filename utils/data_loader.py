@@ -0,0 +1,137 @@
+# utils/data_loader.py
+"""
+Capa de acceso a datos para las páginas del dashboard.
+
+Cada dataset de output_data se lee una sola vez con columnas y tipos
+explícitos (ver utils/schemas.py) y se guarda en un almacén compartido por
+todas las sesiones (st.cache_resource + utils/store.py) usando la fecha de
+modificación del archivo como versión: mientras el archivo no cambie, los
+reruns no vuelven a tocar el disco y cada sesión solo guarda sus filtros.
+
+Los DataFrames devueltos son compartidos: no modificarlos en el lugar.
+Con VALD_PROFILE los loaders se perfilan (utils/profiling.py).
+"""
+import os
+
+import pandas as pd
+import streamlit as st
+
+from utils.schemas import CSV_ENGINE, dataset_version, read_dataset
+from utils import profiling, query
+from utils.facets import FacetIndex
+from utils.longitudinal import AthleteSeries
+from utils.mart import (
+    MARTS, build_marts, longitudinal_path, mart_is_stale, mart_path, mart_version, norms_path, test_index_path,
+)
+from utils.profile_index import ProfileIndex
+from utils.store import DatasetStore
+from utils.athlete_index import TestIndex
+from utils.traces import INDEX_FILE, TraceStore, traces_dir
+
+@st.cache_resource(show_spinner=False)
+def get_store():
+    """Almacén único del proceso (una copia de cada tabla para todos los usuarios)."""
+    return DatasetStore()
+
+
+@profiling.profiled
+def load_dataset(name):
+    """Devuelve el DataFrame tipado del dataset o None si aún no se extrajo."""
+    version = dataset_version(name)
+    if version is None:
+        return None
+    return get_store().get(("dataset", name), version, lambda: read_dataset(name))
+
+
+@profiling.profiled
+def load_profile_index():
+    """Índice de perfiles (utils/profile_index.py) o None si aún no se extrajo."""
+    version = dataset_version("profiles")
+    if version is None:
+        return None
+    return get_store().get(("index", "profiles"), version, lambda: ProfileIndex(load_dataset("profiles")))
+
+
+@profiling.profiled
+def ensure_mart(name):
+    """
+    Garantiza que la tabla materializada de `name` esté al día: si no existe
+    o quedó vieja respecto de los CSV se regenera. False si no hay datos.
+    """
+    if mart_is_stale(name):
+        # build_marts espera a otra regeneración en curso (de este u otro
+        # proceso) y vuelve a mirar si la tabla sigue vieja
+        build_marts(names=[name], if_stale=True)
+    return mart_path(name).exists()
+
+
+@profiling.profiled
+def load_mart(name):
+    """Devuelve la tabla materializada de `name` o None si no hay datos."""
+    if not ensure_mart(name):
+        return None
+    return get_store().get(("mart", name), mart_version(name), lambda: pd.read_parquet(mart_path(name)))
+
+
+@profiling.profiled
+def load_facets(name):
+    """Índice de facetas (utils/facets.py) de la tabla `name` o None si no hay datos."""
+    if not ensure_mart(name):
+        return None
+
+    def _build():
+        # Solo se leen las columnas de filtro
+        wanted = MARTS[name]["facets"] + ["Fecha Test"]
+        cols = [c for c in query.columns(name) if c in wanted]
+        return FacetIndex(pd.read_parquet(mart_path(name), columns=cols), MARTS[name]["facets"], "Fecha Test")
+
+    return get_store().get(("facets", name), mart_version(name), _build)
+
+
+@profiling.profiled
+def load_athlete_series():
+    """Series longitudinales indexadas por atleta (utils/longitudinal.py) o None."""
+    for name in MARTS:
+        ensure_mart(name)
+    path = longitudinal_path()
+    if not path.exists():
+        return None
+    return get_store().get(("series",), path.stat().st_mtime_ns, lambda: AthleteSeries(pd.read_parquet(path)))
+
+
+@profiling.profiled
+def load_norms():
+    """Digests normativos de todas las tablas (utils/norms.py) o None."""
+    for name in MARTS:
+        ensure_mart(name)
+    path = norms_path()
+    if not path.exists():
+        return None
+    return get_store().get(("norms",), path.stat().st_mtime_ns, lambda: pd.read_parquet(path))
+
+
+@profiling.profiled
+def load_test_index():
+    """Índice unificado de tests por atleta (utils/athlete_index.py) o None."""
+    for name in MARTS:
+        ensure_mart(name)
+    path = test_index_path()
+    if not path.exists():
+        return None
+    return get_store().get(("tests",), path.stat().st_mtime_ns, lambda: TestIndex(pd.read_parquet(path)))
+
+
+@profiling.profiled
+def load_traces():
+    """Almacén de trazas fuerza-tiempo (utils/traces.py) o None si no se descargaron."""
+    index_path = traces_dir() / INDEX_FILE
+    if not index_path.exists():
+        return None
+    return get_store().get(("traces",), index_path.stat().st_mtime_ns, lambda: TraceStore(traces_dir()))
+
+
+@profiling.profiled
+def load_csv(path):
+    """Lee cualquier CSV con caché por fecha de modificación (visor genérico)."""
+    path = str(path)
+    return get_store().get(("csv", path), os.stat(path).st_mtime_ns, lambda: pd.read_csv(path, engine=CSV_ENGINE))
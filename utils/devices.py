@@ -0,0 +1,371 @@
+# utils/devices.py
+"""
+Registro de dispositivos VALD y pipeline de extracción compartido.
+
+Cada dispositivo se declara con su host, endpoint, campo cursor de la
+paginación, columnas de fecha y archivo de salida; todos se extraen con el
+mismo código:
+    - iter_pages recorre la API página por página (paginación por
+      modifiedFromUtc) y entrega los bytes de cada página apenas llegan; el
+      cursor se lee de los bytes, sin decodificar la página;
+    - PagePool decodifica (utils/jsonio.py) y convierte cada página a
+      DataFrame en un pool de procesos con cola acotada, mientras el hilo de
+      descarga sigue pidiendo páginas;
+    - fetch_device une los DataFrames de las páginas al final (nunca se
+      acumula la lista completa de dicts);
+    - extract_devices corre todos los dispositivos a la vez con un pool
+      acotado, así agregar un dispositivo no suma su tiempo al total.
+
+Agregar un dispositivo es agregar una entrada a DEVICES (y su esquema en
+utils/schemas.py).
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from utils import http, jsonio, logs, metrics
+from utils.normalize import (
+    FORCEDECKS_SCHEMA, SIDE_FILES, migrate_forcedecks, normalize_forcedecks, parse_offsets, parse_timestamps,
+)
+
+log = logs.get_logger("devices")
+
+# Claves de la respuesta que pueden contener la lista de registros
+ITEM_KEYS = ["tests", "items", "data"]
+
+# Campos alternativos para el cursor si el registro no trae el declarado
+CURSOR_FALLBACKS = ["modifiedDateUtc", "modifiedDate", "lastModified", "updatedAt", "dateModified", "modified"]
+
+# Límite de páginas por dispositivo (protección contra bucles infinitos)
+MAX_PAGES = 1000
+
+# Procesos para transformar páginas (0 = en el hilo de descarga) y tamaño
+# mínimo (bytes) de página que se manda al pool; las más chicas se
+# transforman en el hilo de descarga
+PROCESS_WORKERS = os.cpu_count() or 1
+POOL_THRESHOLD = 256 * 1024
+
+# Definición de cada dispositivo: nombre visible, host y endpoint del listado
+# de tests, campo cursor, columnas de fecha (None = las que terminan en "Utc")
+# y de offset en minutos (opcional),
+# dataset de utils/schemas.py, hoja de Google Sheets, normalizador opcional
+# (devuelve los tests y sus tablas laterales, ver side_files; None = CSV tal cual)
+# y migración opcional del archivo de versiones anteriores (antes de agregarle tests).
+# "verified": False marca los endpoints no confirmados contra la API: quedan
+# fuera de la extracción por defecto (ver default_devices)
+DEVICES = {
+    "nordbord": {
+        "label": "NordBord",
+        "host": "https://prd-use-api-externalnordbord.valdperformance.com",
+        "endpoint": "/tests/v2",
+        "cursor": "modifiedDateUtc",
+        "timestamps": ["modifiedDateUtc", "testDateUtc"],
+        "file": "all_nordbord.csv",
+        "sheet": "NordBord_VALD",
+        "normalize": None,
+    },
+    "forceframe": {
+        "label": "ForceFrame",
+        "host": "https://prd-use-api-externalforceframe.valdperformance.com",
+        "endpoint": "/tests/v2",
+        "cursor": "modifiedDateUtc",
+        "timestamps": ["modifiedDateUtc", "testDateUtc"],
+        "file": "all_forceframe.csv",
+        "sheet": "ForceFrame_VALD",
+        "normalize": None,
+    },
+    "forcedecks": {
+        "label": "ForceDecks",
+        "host": "https://prd-use-api-extforcedecks.valdperformance.com",
+        "endpoint": "/tests",
+        "cursor": "modifiedDateUtc",
+        # Los offsets son minutos y los campos anidados se aplanan al guardar
+        "timestamps": FORCEDECKS_SCHEMA["timestamps"],
+        "offsets": FORCEDECKS_SCHEMA["offsets"],
+        "file": "all_forcedecks.csv",
+        "sheet": "ForceDecks_VALD",
+        "normalize": normalize_forcedecks,
+        "side_files": SIDE_FILES,
+        "migrate": migrate_forcedecks,
+    },
+    "dynamo": {
+        "label": "DynaMo",
+        "host": "https://prd-use-api-extdynamo.valdperformance.com",
+        "endpoint": "/tests",
+        "cursor": "modifiedDateUtc",
+        "timestamps": None,
+        "file": "all_dynamo.csv",
+        "sheet": "Dynamo_VALD",
+        "normalize": None,
+    },
+    # NO VERIFICADOS contra la API: host y endpoint de SmartSpeed y HumanTrak
+    # son una suposición por analogía con DynaMo. Solo se extraen si se piden
+    # con --device o VALD_DEVICES
+    "smartspeed": {
+        "label": "SmartSpeed",
+        "verified": False,
+        "host": "https://prd-use-api-extsmartspeed.valdperformance.com",
+        "endpoint": "/tests",
+        "cursor": "modifiedDateUtc",
+        "timestamps": None,
+        "file": "all_smartspeed.csv",
+        "sheet": "SmartSpeed_VALD",
+        "normalize": None,
+    },
+    "humantrak": {
+        "label": "HumanTrak",
+        "verified": False,
+        "host": "https://prd-use-api-exthumantrak.valdperformance.com",
+        "endpoint": "/tests",
+        "cursor": "modifiedDateUtc",
+        "timestamps": None,
+        "file": "all_humantrak.csv",
+        "sheet": "HumanTrak_VALD",
+        "normalize": None,
+    },
+}
+
+
+def default_devices(value=None):
+    """
+    Dispositivos a extraer cuando no se eligen: los de `value` (VALD_DEVICES,
+    nombres separados por coma) o todos los verificados.
+    """
+    if not value:
+        return [name for name, device in DEVICES.items() if device.get("verified", True)]
+    names = [n.strip().lower() for n in value.split(",") if n.strip()]
+    unknown = [n for n in names if n not in DEVICES]
+    if unknown:
+        raise ValueError(f"Dispositivos desconocidos en VALD_DEVICES: {', '.join(unknown)}")
+    return names
+
+
+def next_cursor(value, current):
+    """
+    Cursor de la página siguiente a partir de la fecha del último registro.
+    Si no avanza (muchos tests con la misma fecha) se suma 1 ms.
+    """
+    if value != current:
+        return value
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00")) + timedelta(milliseconds=1)
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def iter_pages(name, token, tenant_id, since, profile_id=None):
+    """
+    Páginas del dispositivo desde `since` (bytes de la respuesta, sin
+    decodificar), a medida que llegan. El cursor sale del último registro
+    (jsonio.last_string: de los bytes cuando es seguro, si no decodificando).
+    """
+    device = DEVICES[name]
+    url = device["host"] + device["endpoint"]
+    fields = [device["cursor"]] + [f for f in CURSOR_FALLBACKS if f != device["cursor"]]
+    current = since
+    for page in range(MAX_PAGES):
+        params = {"tenantId": tenant_id, "modifiedFromUtc": current}
+        if profile_id:
+            params["profileId"] = profile_id
+        response = http.get(url, token, params=params)
+        if response.status_code == 204:
+            return
+        if response.status_code != 200:
+            log.error(f"❌ {device['label']}: error {response.status_code}: {response.text[:200]}")
+            return
+        content = response.content
+        log.debug(f"{device['label']}: página {page + 1} desde {current} ({len(content)} bytes)")
+        value = jsonio.last_string(content, fields, ITEM_KEYS)
+        if value is None:
+            # Página vacía o registros sin fecha de modificación: es la última
+            if content:
+                yield content
+            return
+        yield content
+        current = next_cursor(value, current)
+    log.warning(f"⚠️ {device['label']}: alcanzado el límite de {MAX_PAGES} páginas")
+
+
+def page_frame(name, items):
+    """DataFrame de una página con las fechas (y offsets) del dispositivo ya parseados."""
+    device = DEVICES[name]
+    df = pd.DataFrame(items)
+    timestamps = device["timestamps"]
+    if timestamps is None:
+        timestamps = [c for c in df.columns if c.endswith("Utc")]
+    parse_offsets(df, device.get("offsets", []))
+    return parse_timestamps(df, timestamps)
+
+
+def transform_page(name, content):
+    """Bytes de una página -> DataFrame. Corre en los procesos del PagePool."""
+    return page_frame(name, jsonio.decode_page(content, ITEM_KEYS))
+
+
+class PagePool:
+    """
+    Transforma páginas (decodificar, DataFrame, fechas) en un pool de
+    procesos mientras los hilos de descarga siguen pidiendo páginas. A lo sumo
+    `max_pending` páginas esperan en la cola: si se llena, el hilo de descarga
+    espera (back-pressure). Las páginas chicas se transforman en el hilo de
+    descarga (no vale la pena el viaje al otro proceso).
+    """
+
+    def __init__(self, workers=PROCESS_WORKERS, max_pending=None):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max_pending or 2 * max(1, workers))
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: no se copia el estado del proceso padre (hilos, Streamlit)
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def submit(self, name, content):
+        """Future con el DataFrame de la página."""
+        if self.workers < 1 or len(content) < POOL_THRESHOLD:
+            future = Future()
+            try:
+                future.set_result(transform_page(name, content))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        self._slots.acquire()
+        try:
+            future = self._get_executor().submit(transform_page, name, content)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+
+def fetch_device(name, token, tenant_id, since, profile_id=None, pool=None):
+    """Todos los tests del dispositivo desde `since` (DataFrame vacío si no hay)."""
+    if pool is None:
+        with PagePool() as own_pool:
+            return fetch_device(name, token, tenant_id, since, profile_id, own_pool)
+    label = DEVICES[name]["label"]
+    if not DEVICES[name].get("verified", True):
+        log.warning(f"⚠️ {label}: endpoint no verificado contra la API")
+    log.info(f"🔄 {label}: extrayendo tests desde {since}...")
+    futures = []
+    try:
+        for content in iter_pages(name, token, tenant_id, since, profile_id):
+            futures.append(pool.submit(name, content))
+    except Exception as e:
+        log.error(f"❌ {label}: error en la solicitud: {e}")
+    frames = []
+    for future in futures:
+        try:
+            frames.append(future.result())
+        except Exception as e:
+            log.error(f"❌ {label}: error al procesar una página: {e}")
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        log.warning(f"⚠️ {label}: no se obtuvieron datos")
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    if "testId" in df.columns:
+        # Las páginas se solapan en el cursor: un test puede venir dos veces
+        df = df.drop_duplicates("testId", keep="last").reset_index(drop=True)
+    df["tenant_id"] = tenant_id
+    metrics.count("pages", name, len(frames))
+    metrics.count("records", name, len(df))
+    log.info(f"🎉 {label}: {len(df)} registros en {len(frames)} páginas")
+    return df
+
+
+def extract_devices(names, token, tenant_id, since, max_workers=http.MAX_WORKERS, process_workers=PROCESS_WORKERS):
+    """
+    Extrae varios dispositivos en paralelo (un hilo de descarga por
+    dispositivo, un pool de procesos compartido para transformar las
+    páginas). `since` es una fecha o {nombre: fecha}. Devuelve {nombre: DataFrame}.
+    """
+    if not isinstance(since, dict):
+        since = dict.fromkeys(names, since)
+    results = {}
+    with PagePool(process_workers) as pool:
+        for name, df, error in http.map_concurrent(
+            lambda n: fetch_device(n, token, tenant_id, since[n], pool=pool), names, max_workers
+        ):
+            if error is not None:
+                log.error(f"❌ {DEVICES[name]['label']}: {error}")
+                df = pd.DataFrame()
+            results[name] = df
+    # Mismo orden que `names`
+    return {name: results[name] for name in names}
+
+
+def last_cursor(name, tenant_id, output_dir):
+    """
+    Fecha de modificación más reciente guardada del dispositivo para el
+    tenant (ISO 8601), o None si todavía no hay tests.
+    """
+    device = DEVICES[name]
+    path = os.path.join(output_dir, device["file"])
+    if not os.path.exists(path):
+        return None
+    header = pd.read_csv(path, nrows=0).columns
+    if device["cursor"] not in header:
+        return None
+    columns = [device["cursor"]] + (["tenant_id"] if "tenant_id" in header else [])
+    df = pd.read_csv(path, usecols=columns, dtype=str)
+    if "tenant_id" in df.columns:
+        df = df[df["tenant_id"] == str(tenant_id)]
+    dates = pd.to_datetime(df[device["cursor"]], errors="coerce", utc=True, format="ISO8601").dropna()
+    if dates.empty:
+        return None
+    return dates.max().strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def _write_table(path, df, replaced_ids=None):
+    """
+    Escribe la tabla en `path`. Con `replaced_ids` se conservan las filas
+    del archivo existente de los demás tests (las de esos ids se reemplazan).
+    """
+    if replaced_ids is not None and os.path.exists(path):
+        old = pd.read_csv(path, dtype=str)
+        if "testId" in old.columns:
+            old = old[~old["testId"].isin(replaced_ids)]
+        if not old.empty:
+            df = pd.concat([old, df], ignore_index=True)
+    df.to_csv(path, index=False)
+    return df
+
+
+def save_device(name, df, output_dir, merge=False):
+    """
+    Guarda los tests del dispositivo en su archivo (y sus tablas laterales).
+    Con merge=True se agregan/actualizan los tests sobre los ya guardados en
+    lugar de reemplazar el archivo. Devuelve la tabla de tests guardada.
+    """
+    device = DEVICES[name]
+    replaced_ids = None
+    if merge and "testId" in df.columns:
+        replaced_ids = set(df["testId"].astype(str))
+    if replaced_ids is not None and device.get("migrate") is not None:
+        device["migrate"](output_dir)
+    sides = {}
+    if device["normalize"] is not None:
+        df, sides = device["normalize"](df)
+    for table, filename in device.get("side_files", {}).items():
+        side = sides.get(table, pd.DataFrame(columns=["testId", "Origen"]))
+        _write_table(os.path.join(output_dir, filename), side, replaced_ids)
+    return _write_table(os.path.join(output_dir, device["file"]), df, replaced_ids)
@@ -0,0 +1,127 @@
+# utils/exports.py
+"""
+Archivos de descarga del dashboard (CSV, CSV comprimido, Parquet, Excel).
+
+Cada archivo se genera una sola vez por tabla, versión de la tabla y huella
+de los filtros, y luego se sirve desde la caché. Con Streamlit >= 1.52 el
+botón de descarga recibe una función y el archivo solo se genera cuando
+alguien hace clic. Los CSV de output_data (visor de datos extraídos) se
+sirven igual, con la versión del archivo como clave; en CSV, tal cual están
+en disco.
+"""
+import gzip
+import hashlib
+import importlib.util
+import io
+import json
+import os
+
+import pandas as pd
+import streamlit as st
+
+from utils import query
+from utils.data_loader import load_csv
+from utils.transforms import age_at
+
+# Formatos disponibles: etiqueta -> (extensión, mime)
+FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "CSV comprimido (.gz)": ("csv.gz", "application/gzip"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+# Excel usa openpyxl (en requirements.txt); si falta, el formato no se ofrece
+if importlib.util.find_spec("openpyxl") is not None:
+    FORMATS["Excel"] = ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+# Claves internas de las tablas materializadas: no forman parte de las descargas
+KEY_COLUMNS = ["profileId", "testId"]
+
+# st.download_button acepta una función (descarga diferida) desde la versión 1.52
+DEFERRED_DOWNLOADS = tuple(int(p) for p in st.__version__.split(".")[:2]) >= (1, 52)
+
+
+def filters_fingerprint(filters):
+    """Huella estable de un dict de filtros (para nombres y claves)."""
+    raw = json.dumps(filters or {}, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def export_bytes(name, version, fingerprint, filters, fmt, columns=None):
+    """
+    Contenido del archivo `fmt` para la tabla filtrada.
+    `version` y `fingerprint` solo forman parte de la clave de la caché.
+    """
+    df = query.select(name, filters)
+    # La edad a hoy no se materializa: se agrega al exportar
+    if "Fecha de nacimiento" in df.columns and "Edad" not in df.columns:
+        df["Edad"] = age_at(df["Fecha de nacimiento"])
+    if columns:
+        df = df[[c for c in columns if c in df.columns]]
+    else:
+        df = df.drop(columns=[c for c in KEY_COLUMNS if c in df.columns])
+    return frame_bytes(df, fmt)
+
+
+def frame_bytes(df, fmt):
+    """Serializa un DataFrame en el formato `fmt` (una clave de FORMATS)."""
+    ext = FORMATS[fmt][0]
+    if ext == "csv":
+        return df.to_csv(index=False).encode("utf-8")
+    if ext == "csv.gz":
+        return gzip.compress(df.to_csv(index=False).encode("utf-8"), compresslevel=6)
+    buffer = io.BytesIO()
+    if ext == "parquet":
+        df.to_parquet(buffer, index=False)
+    else:
+        # Excel no admite fechas con zona horaria: se guardan en UTC sin zona
+        tz_columns = [c for c in df.columns if isinstance(df[c].dtype, pd.DatetimeTZDtype)]
+        df = df.assign(**{c: df[c].dt.tz_convert("UTC").dt.tz_localize(None) for c in tz_columns})
+        df.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def file_bytes(path, version, fmt):
+    """
+    Contenido de un CSV de output_data en el formato `fmt`; en CSV se sirve
+    el archivo tal cual. `version` (mtime) solo forma parte de la clave.
+    """
+    if FORMATS[fmt][0] == "csv":
+        with open(path, "rb") as f:
+            return f.read()
+    return frame_bytes(load_csv(path), fmt)
+
+
+def _menu(content, file_stem, label, key):
+    """Selector de formato + botón; `content(fmt)` devuelve los bytes del archivo."""
+    col_fmt, col_btn = st.columns([1, 2])
+    with col_fmt:
+        fmt = st.selectbox("Formato", list(FORMATS), key=f"{key}_fmt", label_visibility="collapsed")
+    ext, mime = FORMATS[fmt]
+
+    def _contenido():
+        return content(fmt)
+
+    with col_btn:
+        st.download_button(
+            label=label,
+            data=_contenido if DEFERRED_DOWNLOADS else _contenido(),
+            file_name=f"{file_stem}.{ext}",
+            mime=mime,
+            key=f"{key}_btn",
+        )
+
+
+def download_menu(name, version, filters, file_stem, label, key, columns=None):
+    """Selector de formato + botón de descarga para la tabla filtrada."""
+    fingerprint = filters_fingerprint(filters)
+    _menu(lambda fmt: export_bytes(name, version, fingerprint, filters, fmt, columns), file_stem, label, key)
+
+
+def file_download_menu(path, label, key):
+    """Selector de formato + botón de descarga para un CSV de output_data."""
+    path = str(path)
+    version = os.stat(path).st_mtime_ns
+    file_stem = os.path.splitext(os.path.basename(path))[0]
+    _menu(lambda fmt: file_bytes(path, version, fmt), file_stem, label, key)
@@ -0,0 +1,111 @@
+# utils/facets.py
+"""
+Índices de facetas para los filtros del dashboard.
+
+Al cargar una tabla materializada se calcula, para cada columna de filtro,
+la lista de posiciones de fila (postings) de cada valor, y para la columna
+de fecha un orden por fecha. Las opciones de los widgets, sus cantidades y
+las máscaras de filtro salen de intersecciones de postings, sin recorrer
+las columnas completas en cada rerun.
+
+Los filtros usan el mismo formato que utils/query.py: lista de valores o
+("between", desde, hasta) para la fecha.
+"""
+import numpy as np
+import pandas as pd
+
+
+class FacetIndex:
+    """Postings por valor de cada faceta y orden por fecha de una tabla."""
+
+    def __init__(self, df, columns, date_column=None):
+        self._n = len(df)
+        self._postings = {}
+        for col in columns:
+            if col in df.columns:
+                s = df[col]
+                # groupby().indices devuelve las posiciones de cada valor en orden
+                self._postings[col] = {
+                    value: np.asarray(pos) for value, pos in s.groupby(s, observed=True).indices.items()
+                }
+        self._date_column = date_column if date_column in df.columns else None
+        if self._date_column:
+            dates = df[date_column].to_numpy(dtype="datetime64[ns]")
+            self._date_order = np.argsort(dates, kind="stable")
+            self._date_sorted = dates[self._date_order]
+            # Los NaT quedan al final del orden y no entran en los rangos
+            self._date_valid = int((~np.isnat(self._date_sorted)).sum())
+
+    def __len__(self):
+        return self._n
+
+    def columns(self):
+        return list(self._postings)
+
+    def values(self, column):
+        """Valores distintos (ordenados) de la faceta."""
+        return sorted(self._postings.get(column, {}))
+
+    def bounds(self):
+        """(fecha mínima, fecha máxima) como Timestamp, o (None, None)."""
+        if not self._date_column or not self._date_valid:
+            return None, None
+        return pd.Timestamp(self._date_sorted[0]), pd.Timestamp(self._date_sorted[self._date_valid - 1])
+
+    def _rows(self, column, value):
+        """Máscara de filas que cumplen el filtro de una columna."""
+        mask = np.zeros(self._n, dtype=bool)
+        if column == self._date_column and isinstance(value, tuple):
+            _, desde, hasta = value
+            valid = self._date_sorted[:self._date_valid]
+            lo = np.searchsorted(valid, np.datetime64(pd.Timestamp(desde), "ns"), side="left")
+            hi = np.searchsorted(valid, np.datetime64(pd.Timestamp(hasta), "ns"), side="right")
+            mask[self._date_order[lo:hi]] = True
+            return mask
+        if column not in self._postings:
+            raise KeyError(f"La columna {column} no es una faceta indexada")
+        postings = self._postings[column]
+        for v in value:
+            if v in postings:
+                mask[postings[v]] = True
+        return mask
+
+    @staticmethod
+    def _active(filters):
+        """Filtros no vacíos (mismo criterio que utils/query.py)."""
+        active = {}
+        for col, value in (filters or {}).items():
+            if value is None:
+                continue
+            if isinstance(value, tuple):
+                if value[1] is not None and value[2] is not None:
+                    active[col] = value
+            elif len(value):
+                active[col] = value
+        return active
+
+    def mask(self, filters=None, exclude=None):
+        """Máscara booleana de las filas que cumplen todos los filtros (menos `exclude`)."""
+        mask = np.ones(self._n, dtype=bool)
+        for col, value in self._active(filters).items():
+            if col != exclude:
+                mask &= self._rows(col, value)
+        return mask
+
+    def count(self, filters=None):
+        """Cantidad de filas que cumplen los filtros."""
+        return int(self.mask(filters).sum())
+
+    def counts(self, column, filters=None):
+        """
+        Cantidad de filas por valor de `column` con los demás filtros aplicados
+        (el filtro de la propia columna no se aplica, como en una búsqueda facetada).
+        Solo incluye valores con al menos una fila.
+        """
+        mask = self.mask(filters, exclude=column)
+        counts = {}
+        for value, pos in self._postings.get(column, {}).items():
+            n = int(mask[pos].sum())
+            if n:
+                counts[value] = n
+        return dict(sorted(counts.items()))
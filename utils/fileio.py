@@ -0,0 +1,92 @@
+# utils/fileio.py
+"""
+Escritura de archivos compartidos entre procesos (dashboard, CLI, trabajo
+de extracción).
+
+    - try_lock / unlock / file_lock: lock exclusivo del sistema operativo
+      (flock; msvcrt.locking en Windows) sobre un archivo abierto. Lo libera
+      el kernel si el proceso termina, así que no quedan locks viejos.
+    - atomic_write: escribe en un temporal con nombre único junto al destino
+      y lo reemplaza de forma atómica. Dos escritores del mismo archivo no
+      pisan sus temporales y los lectores nunca ven un archivo a medias.
+"""
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Segundos entre intentos de file_lock mientras otro proceso tiene el lock
+LOCK_POLL = 0.1
+
+
+def try_lock(fd):
+    """Lock exclusivo sin esperar sobre `fd`; False si lo tiene otro."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def unlock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+def open_lock_file(path):
+    """Descriptor del archivo de lock (se crea si no existe)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Lock exclusivo entre procesos (y entre hilos) sobre `path`: espera hasta
+    que quien lo tenga lo libere.
+    """
+    fd = open_lock_file(path)
+    try:
+        while not try_lock(fd):
+            time.sleep(LOCK_POLL)
+        try:
+            yield
+        finally:
+            unlock(fd)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_write(path):
+    """
+    Ruta temporal única junto a `path`; al salir sin error reemplaza a `path`.
+    Si el bloque falla, el temporal se borra y `path` queda como estaba.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp", delete=False) as f:
+        tmp_path = Path(f.name)
+    # NamedTemporaryFile lo crea con permisos 0600
+    os.chmod(tmp_path, 0o644)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
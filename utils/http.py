@@ -0,0 +1,80 @@
+# utils/http.py
+"""
+Cliente HTTP compartido por los extractores.
+
+Cada hilo usa su propia requests.Session (conexiones keep-alive y reintentos
+con backoff para 429/5xx), y map_concurrent ejecuta muchas llamadas con un
+pool de hilos de tamaño acotado. Durante una corrida de extracción cada
+request queda registrado en utils/metrics.py (latencia, bytes, reintentos).
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils import metrics
+
+# Hilos por defecto para las descargas concurrentes
+MAX_WORKERS = 8
+
+# Tiempo máximo de espera por request (segundos)
+TIMEOUT = 60
+
+_local = threading.local()
+
+
+def session():
+    """Session del hilo actual (se crea la primera vez)."""
+    s = getattr(_local, "session", None)
+    if s is None:
+        retry = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET"],
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_WORKERS, max_retries=retry)
+        s = requests.Session()
+        s.mount("https://", adapter)
+        s.mount("http://", adapter)
+        _local.session = s
+    return s
+
+
+def get(url, token, params=None, timeout=TIMEOUT):
+    """GET autenticado con el token de VALD."""
+    headers = {"Authorization": f"Bearer {token}", "Accept": "application/json"}
+    run = metrics.current()
+    if run is None:
+        return session().get(url, headers=headers, params=params, timeout=timeout)
+    t0 = time.perf_counter()
+    try:
+        response = session().get(url, headers=headers, params=params, timeout=timeout)
+    except Exception:
+        run.observe_request(url, time.perf_counter() - t0)
+        raise
+    retries = getattr(getattr(response.raw, "retries", None), "history", ())
+    run.observe_request(url, time.perf_counter() - t0, response.status_code, len(response.content), len(retries))
+    return response
+
+
+def map_concurrent(func, items, max_workers=MAX_WORKERS):
+    """
+    Aplica func a cada item con un pool de hilos acotado. Devuelve los
+    pares (item, resultado, error) a medida que terminan.
+    """
+    items = list(items)
+    if not items:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as pool:
+        futures = {pool.submit(func, item): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                yield item, future.result(), None
+            except Exception as e:
+                yield item, None, e
@@ -0,0 +1,220 @@
+# utils/jobs.py
+"""
+Trabajos en segundo plano (la extracción) fuera del script de Streamlit.
+
+El trabajo corre en un hilo del servidor, no en el rerun de la sesión que lo
+pidió: cerrar o refrescar el navegador no lo corta. Una sola ejecución a la
+vez (single-flight) aunque haya varios usuarios o varios procesos:
+    - un lock del sistema operativo (flock, ver utils/fileio.py) sobre un
+      archivo en output_data/jobs: lo libera el kernel cuando el proceso
+      dueño termina, así que un lock viejo (reinicio, pid reutilizado)
+      nunca bloquea;
+    - el estado (paso, progreso, últimos registros de log, error) se escribe
+      de forma atómica en un JSON junto al lock, en lote y a lo sumo cada
+      logs.FLUSH_SECONDS (ver utils/logs.py).
+Quien pide un trabajo que ya está corriendo recibe el estado del existente
+(se "engancha" a él) en lugar de lanzar un duplicado. La UI solo lee el JSON.
+"""
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from utils import logs
+from utils.fileio import open_lock_file, try_lock, unlock
+from utils.schemas import OUTPUT_DIR
+
+JOBS_DIR_NAME = "jobs"
+
+# Estados posibles
+IDLE, RUNNING, DONE, ERROR, INTERRUPTED = "idle", "running", "done", "error", "interrupted"
+
+log = logs.get_logger("jobs")
+
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class Job:
+    """
+    Trabajo único con nombre: `target(log_cb, progress_cb)` corre en un hilo
+    y su estado queda en output_data/jobs/{name}.json.
+    """
+
+    def __init__(self, name, target, directory=None):
+        self.name = name
+        self.target = target
+        self.dir = Path(directory) if directory else Path(OUTPUT_DIR) / JOBS_DIR_NAME
+        self.status_path = self.dir / f"{name}.json"
+        self.lock_path = self.dir / f"{name}.lock"
+        self._lock = threading.Lock()
+        self._lock_fd = None
+        self._state = None
+        self._handler = None
+        self._dirty = False
+        self._written_seq = 0
+
+    # --- lock entre procesos ---
+
+    def _acquire(self):
+        """Toma el lock del trabajo; False si otro proceso (o instancia) lo tiene."""
+        if self._lock_fd is not None:
+            return False
+        fd = open_lock_file(self.lock_path)
+        # Reintento corto: is_running de otro proceso puede tenerlo un instante
+        for _ in range(3):
+            if try_lock(fd):
+                break
+            time.sleep(0.05)
+        else:
+            os.close(fd)
+            return False
+        # Dueño del lock, solo informativo (el lock lo mantiene el kernel)
+        os.ftruncate(fd, 0)
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.write(fd, f"{os.getpid()}@{socket.gethostname()}".encode())
+        self._lock_fd = fd
+        return True
+
+    def _release(self):
+        if self._lock_fd is not None:
+            unlock(self._lock_fd)
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def is_running(self):
+        """True si algún proceso tiene el lock del trabajo."""
+        if self._lock_fd is not None:
+            return True
+        if not self.lock_path.exists():
+            return False
+        fd = open_lock_file(self.lock_path)
+        try:
+            if not try_lock(fd):
+                return True
+            unlock(fd)
+            return False
+        finally:
+            os.close(fd)
+
+    # --- estado ---
+
+    def _write(self):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.status_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(self._state, ensure_ascii=False))
+        os.replace(tmp_path, self.status_path)
+
+    def status(self):
+        """Estado del último trabajo (dict); "interrupted" si su proceso murió."""
+        try:
+            state = json.loads(self.status_path.read_text())
+        except (FileNotFoundError, ValueError):
+            return {"state": IDLE, "log": []}
+        if state.get("state") == RUNNING and not self.is_running():
+            state["state"] = INTERRUPTED
+        return state
+
+    # --- ejecución ---
+
+    def _begin(self):
+        """Toma el lock y reinicia el estado; None si ya hay un trabajo en curso."""
+        with self._lock:
+            if not self._acquire():
+                return None
+            self._state = {
+                "id": uuid.uuid4().hex[:12],
+                "state": RUNNING,
+                "pid": os.getpid(),
+                "started": _now(),
+                "finished": None,
+                "step": 0,
+                "total": 1,
+                "text": "Iniciando",
+                "log": [],
+                "error": None,
+            }
+            self._write()
+            return dict(self._state)
+
+    def start(self):
+        """
+        Lanza el trabajo en un hilo si no hay otro en curso. Devuelve (estado,
+        lanzado): si ya corría, `lanzado` es False y el estado es el del
+        trabajo existente.
+        """
+        state = self._begin()
+        if state is None:
+            return self.status(), False
+        threading.Thread(target=self._run, name=f"job-{self.name}", daemon=True).start()
+        return state, True
+
+    def run(self):
+        """Como start, pero corre el trabajo en el hilo actual y devuelve el estado final."""
+        if self._begin() is None:
+            return self.status(), False
+        self._run()
+        return self.status(), True
+
+    def _log(self, message):
+        log.info(message)
+
+    def _progress(self, current, total, text):
+        # Se publica en el próximo flush
+        with self._lock:
+            self._state.update(step=current, total=total, text=text)
+            self._dirty = True
+
+    def _flush(self, **changes):
+        """Publica el estado y los registros del buffer en el archivo de estado."""
+        with self._lock:
+            self._state.update(changes)
+            if self._handler is not None:
+                self._written_seq, self._state["log"] = self._handler.snapshot()
+            self._dirty = False
+            self._write()
+
+    def _flush_loop(self, stop):
+        while not stop.wait(logs.FLUSH_SECONDS):
+            if self._dirty or self._handler.seq != self._written_seq:
+                self._flush()
+
+    def _run(self):
+        logger = logs.configure()
+        self._handler = logs.RingBufferHandler()
+        self._written_seq = 0
+        logger.addHandler(self._handler)
+        stop = threading.Event()
+        flusher = threading.Thread(target=self._flush_loop, args=(stop,), name=f"job-{self.name}-flush", daemon=True)
+        flusher.start()
+        result = {"state": INTERRUPTED}
+        try:
+            self.target(self._log, self._progress)
+            result = {"state": DONE}
+        except Exception as e:
+            log.exception(f"❌ {e}")
+            result = {"state": ERROR, "error": str(e)}
+        finally:
+            stop.set()
+            flusher.join()
+            logger.removeHandler(self._handler)
+            self._flush(finished=_now(), **result)
+            self._handler = None
+            self._release()
+
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def get_job(name, target):
+    """Instancia única del trabajo `name` en el proceso."""
+    with _jobs_lock:
+        if name not in _jobs:
+            _jobs[name] = Job(name, target)
+        return _jobs[name]
@@ -0,0 +1,103 @@
+# utils/jsonio.py
+"""
+Decodificación de las páginas JSON de la API.
+
+response.json() primero convierte los bytes a texto (adivinando la
+codificación si el servidor no la informa) y después los decodifica con json
+de la biblioteca estándar. Acá loads usa el parser más rápido instalado
+(orjson o msgspec) directo sobre los bytes, y decode_page devuelve los
+registros de una página para pasarlos a DataFrame de a una página por vez.
+
+orjson y msgspec son opcionales: sin ellos se usa json con el mismo resultado.
+"""
+import json
+import re
+
+try:
+    import orjson
+    loads = orjson.loads
+    JSON_ENGINE = "orjson"
+except ImportError:
+    try:
+        import msgspec
+        loads = msgspec.json.decode
+        JSON_ENGINE = "msgspec"
+    except ImportError:
+        loads = json.loads
+        JSON_ENGINE = "json"
+
+# Valor de texto simple (sin escapes) que sigue a una clave ("clave": "valor")
+_STRING_VALUE = re.compile(rb'\s*:\s*"([^"\\]*)"')
+
+# Cadenas JSON (con escapes) y llaves/corchetes, para recorrer la cola de una página
+_TOKENS = re.compile(rb'"(?:[^"\\]|\\.)*"|[{}\[\]]')
+
+
+def page_items(data, item_keys):
+    """Lista de registros de una respuesta (lista, dict con una de item_keys u objeto suelto)."""
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        for key in item_keys:
+            if key in data:
+                return data[key]
+        return [data]
+    return [data] if data else []
+
+
+def decode_page(content, item_keys=()):
+    """Lista de registros de una página a partir de los bytes de la respuesta."""
+    if not content:
+        return []
+    return page_items(loads(content), item_keys)
+
+
+def _in_last_item(content, start):
+    """
+    True si la posición `start` está en el nivel superior del último
+    registro: el objeto que la contiene se cierra y después solo queda el
+    cierre de la lista de registros ("]" si la página es una lista, "]}" si es
+    un dict con la lista).
+    """
+    depth = 0
+    for token in _TOKENS.finditer(content, start):
+        char = token.group()
+        if char in (b"{", b"["):
+            depth += 1
+        elif char in (b"}", b"]"):
+            depth -= 1
+            if depth < 0:
+                if char != b"}":
+                    return False
+                rest = b"".join(content[token.end():].split())
+                first = content.lstrip()[:1]
+                return (first, rest) in ((b"[", b"]"), (b"{", b"]}"))
+    return False
+
+
+def last_string(content, fields, item_keys=()):
+    """
+    Valor de texto de alguno de `fields` (en ese orden) en el último registro
+    de la página que lo tenga: el cursor de paginación. Atajo: se toma la
+    última aparición de la clave en los bytes solo si es un texto simple del
+    nivel superior del último registro; si no (la misma clave en un objeto
+    anidado, escapes, null u otra forma de página) se decodifica la página.
+    None si ningún registro tiene alguno de los campos.
+    """
+    if not content:
+        return None
+    for field in fields:
+        key = b'"' + field.encode() + b'"'
+        pos = content.rfind(key)
+        if pos < 0:
+            continue
+        match = _STRING_VALUE.match(content, pos + len(key))
+        if match and _in_last_item(content, match.end()):
+            return match.group(1).decode()
+        break
+    for item in reversed(decode_page(content, item_keys)):
+        if isinstance(item, dict):
+            for field in fields:
+                if isinstance(item.get(field), str):
+                    return item[field]
+    return None
@@ -0,0 +1,89 @@
+# utils/logs.py
+"""
+Log estructurado de la extracción.
+
+Los módulos del pipeline escriben con logging (loggers "vald.*") en lugar de
+print. Mientras corre un trabajo (utils/jobs.py) un RingBufferHandler guarda
+los últimos registros en memoria (deque acotado, O(1) por registro y sin
+tocar la UI); el trabajo publica el buffer en su archivo de estado a lo sumo
+cada FLUSH_SECONDS, en lote, y la página lo lee y filtra por nivel. Escribir
+un log nunca espera a Streamlit ni al disco.
+
+El nivel mínimo que se registra sale de VALD_LOG_LEVEL (INFO por defecto).
+"""
+import logging
+import os
+import sys
+from collections import deque
+from datetime import datetime
+
+LOGGER_NAME = "vald"
+
+# Registros que conserva el buffer y cada cuánto (segundos) se publican
+RING_SIZE = 500
+FLUSH_SECONDS = 0.5
+
+# Niveles que ofrece la UI para filtrar
+LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR"]
+
+
+def get_logger(name):
+    """Logger del módulo `name` dentro de la jerarquía "vald"."""
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+def configure(level=None, console=False):
+    """
+    Nivel del logger "vald" (si no se indica y aún no tiene, VALD_LOG_LEVEL)
+    y, si `console`, salida por consola (línea de comandos).
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    if level or logger.level == logging.NOTSET:
+        logger.setLevel((level or os.getenv("VALD_LOG_LEVEL", "INFO")).upper())
+    if console and not any(getattr(h, "_vald_console", False) for h in logger.handlers):
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s", "%H:%M:%S"))
+        handler._vald_console = True
+        logger.addHandler(handler)
+    return logger
+
+
+class RingBufferHandler(logging.Handler):
+    """Últimos `capacity` registros como dicts (hora, nivel, logger, mensaje)."""
+
+    def __init__(self, capacity=RING_SIZE, level=logging.NOTSET):
+        super().__init__(level)
+        self.records = deque(maxlen=capacity)
+        # Registros recibidos desde el inicio: permite saber si hay algo nuevo
+        self.seq = 0
+
+    def emit(self, record):
+        # logging.Handler.handle ya toma self.lock alrededor de emit
+        message = record.getMessage()
+        if record.exc_info:
+            message += "\n" + logging.Formatter().formatException(record.exc_info)
+        self.records.append({
+            "t": datetime.fromtimestamp(record.created).strftime("%H:%M:%S"),
+            "level": record.levelname,
+            "levelno": record.levelno,
+            "logger": record.name,
+            "msg": message,
+        })
+        self.seq += 1
+
+    def snapshot(self):
+        """(seq, copia de los registros del buffer)."""
+        with self.lock:
+            return self.seq, list(self.records)
+
+
+def format_entries(entries, level="INFO", limit=None):
+    """Texto de los registros de nivel >= `level` (los últimos `limit`)."""
+    levelno = logging.getLevelName(level)
+    lines = [
+        # Los estados de versiones anteriores guardaban líneas de texto
+        e if isinstance(e, str) else f"{e['t']} {e['level'][0]} | {e['msg']}"
+        for e in entries
+        if isinstance(e, str) or e["levelno"] >= levelno
+    ]
+    return "\n".join(lines[-limit:] if limit else lines)
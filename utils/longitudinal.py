@@ -0,0 +1,129 @@
+# utils/longitudinal.py
+"""
+Series longitudinales por atleta.
+
+Para cada atleta, tabla y métrica clave se guarda la serie de tests con las
+métricas derivadas ya calculadas: mejor valor y media de los últimos WINDOW
+tests, cambio respecto del test anterior y tendencia de la asimetría (la
+media móvil de las columnas de desbalance). Al sincronizar solo se recalculan
+las series de los atletas con tests nuevos; las páginas leen la serie de un
+atleta por índice, sin ordenar ni recorrer el historial.
+"""
+import numpy as np
+import pandas as pd
+
+# Cantidad de tests de la ventana móvil
+WINDOW = 5
+
+# Métricas donde el mejor valor es el menor: los desbalances L/R de las
+# tablas (columnas "imbalances" de utils/mart.py)
+LOWER_IS_BETTER = {
+    "Max Imbalance (%)", "Avg Imbalance (%)", "Impulse Imbalance (%)",
+    "Inner Max Imbalance (%)", "Outer Max Imbalance (%)",
+}
+
+SERIES_KEYS = ["Tabla", "profileId", "Métrica"]
+POINT_COLUMNS = SERIES_KEYS + ["Fecha Test", "testId", "Valor"]
+
+
+def points(name, df, metrics):
+    """Puntos (atleta, métrica, fecha, valor) de un lote de tests ya enriquecidos."""
+    metrics = [m for m in metrics if m in df.columns]
+    if not metrics or not {"profileId", "testId", "Fecha Test"}.issubset(df.columns):
+        return None
+    base = df[["profileId", "testId", "Fecha Test"]].astype({"profileId": str, "testId": str})
+    long = pd.concat([base, df[metrics].astype("float64")], axis=1).melt(
+        id_vars=["profileId", "testId", "Fecha Test"], var_name="Métrica", value_name="Valor"
+    )
+    long = long.dropna(subset=["Valor", "Fecha Test"])
+    long.insert(0, "Tabla", name)
+    return long[POINT_COLUMNS]
+
+
+def derive(pts):
+    """
+    Ordena cada serie y calcula Mejor (máximo de la ventana, o mínimo en las
+    métricas de LOWER_IS_BETTER), Media, Cambio y Cambio (%).
+    """
+    df = pts.sort_values(SERIES_KEYS + ["Fecha Test", "testId"]).reset_index(drop=True)
+    grouped = df.groupby(SERIES_KEYS, sort=False)["Valor"]
+    rolling = grouped.rolling(WINDOW, min_periods=1)
+    levels = list(range(len(SERIES_KEYS)))
+    lower = df["Métrica"].isin(LOWER_IS_BETTER)
+    highest = rolling.max().reset_index(level=levels, drop=True)
+    lowest = rolling.min().reset_index(level=levels, drop=True)
+    df["Mejor"] = highest.where(~lower, lowest)
+    df["Media"] = rolling.mean().reset_index(level=levels, drop=True)
+    previous = grouped.shift()
+    df["Cambio"] = df["Valor"] - previous
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df["Cambio (%)"] = (df["Cambio"] / previous.abs() * 100).replace([np.inf, -np.inf], np.nan)
+    return df
+
+
+def upsert(series, name, new_points, replaced=()):
+    """
+    Inserta los puntos nuevos de `name` recalculando solo las series de los
+    atletas afectados. Los puntos anteriores de los testId de `replaced`
+    (tests que cambiaron) se descartan aunque ya no generen puntos.
+    `series` puede ser None (primera sincronización).
+    """
+    has_new = new_points is not None and not new_points.empty
+    if series is None or series.empty:
+        return derive(new_points) if has_new else series
+    stale = (series["Tabla"] == name) & series["testId"].isin(list(replaced))
+    if not has_new and not stale.any():
+        return series
+    profiles = set(series.loc[stale, "profileId"])
+    if has_new:
+        profiles.update(new_points["profileId"].unique())
+    affected = (series["Tabla"] == name) & series["profileId"].isin(profiles)
+    frames = [series.loc[affected & ~stale, POINT_COLUMNS]] + ([new_points] if has_new else [])
+    combined = pd.concat(frames, ignore_index=True)
+    combined = combined.drop_duplicates(["Tabla", "testId", "Métrica"], keep="last")
+    rest = series[~affected]
+    if combined.empty:
+        return rest.reset_index(drop=True)
+    return pd.concat([rest, derive(combined)], ignore_index=True)
+
+
+def replace_table(series, name, new_points):
+    """Reemplaza todas las series de `name` (recálculo completo de la tabla)."""
+    rest = series[series["Tabla"] != name] if series is not None else None
+    own = derive(new_points) if new_points is not None and not new_points.empty else None
+    frames = [f for f in (rest, own) if f is not None]
+    return pd.concat(frames, ignore_index=True) if frames else None
+
+
+class AthleteSeries:
+    """Series de todos los atletas indexadas por profileId."""
+
+    def __init__(self, series):
+        self._df = series.reset_index(drop=True)
+        self._by_profile = {key: np.asarray(pos) for key, pos in self._df.groupby("profileId").indices.items()}
+        self._by_table = {
+            name: list(ids) for name, ids in self._df.groupby("Tabla", observed=True)["profileId"].unique().items()
+        }
+
+    def profiles(self, name=None):
+        """profileIds con alguna serie (de la tabla `name`, si se indica)."""
+        if name is None:
+            return list(self._by_profile)
+        return self._by_table.get(name, [])
+
+    def get(self, profile_id, name=None, metric=None):
+        """Serie del atleta (opcionalmente de una tabla y métrica), ordenada por fecha."""
+        pos = self._by_profile.get(str(profile_id))
+        if pos is None:
+            return self._df.iloc[0:0]
+        df = self._df.iloc[pos]
+        if name is not None:
+            df = df[df["Tabla"] == name]
+        if metric is not None:
+            df = df[df["Métrica"] == metric]
+        return df
+
+    def metrics(self, profile_id, name):
+        """Métricas con serie para el atleta en la tabla `name`."""
+        df = self.get(profile_id, name)
+        return list(dict.fromkeys(df["Métrica"]))
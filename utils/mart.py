@@ -0,0 +1,431 @@
+# utils/mart.py
+"""
+Tablas analíticas materializadas ("mart") para el dashboard.
+
+Una vez por sincronización se cruzan los tests de cada dispositivo con los
+perfiles, se calculan la edad a la fecha del test y los desbalances L/R, se
+renombran las columnas y se guarda el resultado tipado en Parquet. Las
+páginas solo leen y filtran estas tablas.
+
+En la misma pasada se actualizan los agregados por bucket (utils/aggregates.py)
+los percentiles normativos (utils/norms.py) y las series por atleta
+(utils/longitudinal.py) solo con los tests nuevos o modificados.
+
+Una sola regeneración a la vez entre todos los procesos (dashboard, CLI,
+trabajo de extracción): build_marts toma un lock de archivo en la carpeta
+del mart (ver utils/fileio.py).
+"""
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from utils import logs
+from utils.fileio import atomic_write, file_lock
+from utils.aggregates import KEYS as AGG_KEYS
+from utils.aggregates import bucket_keys, in_buckets, merge_aggregates, metric_columns, partial_aggregates
+from utils.longitudinal import points, replace_table, upsert
+from utils.normalize import FORCEDECKS_SCHEMA
+from utils.norms import KEYS as NORM_KEYS
+from utils.norms import merge_norms, partial_norms
+from utils.profile_index import PROFILE_RENAME, ProfileIndex
+from utils.schemas import OUTPUT_DIR, dataset_version, read_dataset
+from utils.transforms import age_at, coerce_numeric, imbalance_pct, round_numeric, to_categories, to_date
+from utils.trials import FORCEDECKS_RESULTS, results_wide
+
+log = logs.get_logger("mart")
+
+# Subcarpeta donde se guardan las tablas materializadas
+MART_DIR_NAME = "mart"
+
+# Agregados por bucket, testId ya incluidos en ellos con su huella y bucket
+# (para la actualización incremental)
+AGGREGATES_FILE = "aggregates.parquet"
+NORMS_FILE = "norms.parquet"
+LONGITUDINAL_FILE = "longitudinal.parquet"
+
+# Índice unificado de tests de todos los dispositivos
+TEST_INDEX_FILE = "tests.parquet"
+AGGREGATED_IDS_FILE = "aggregates_ids.parquet"
+# Lock de las regeneraciones (ver build_marts)
+BUILD_LOCK_FILE = "build.lock"
+
+NORDBORD_RENAME = {
+    "testTypeName": "Test",
+    "device": "Dispositivo",
+    "leftAvgForce": "L Avg Force (N)",
+    "rightAvgForce": "R Avg Force (N)",
+    "leftMaxForce": "L Max Force (N)",
+    "rightMaxForce": "R Max Force (N)",
+    "leftTorque": "L Max Torque (Nm)",
+    "rightTorque": "R Max Torque (Nm)",
+    "leftRepetitions": "L Reps",
+    "rightRepetitions": "R Reps",
+    "leftImpulse": "L Max Impulse (Ns)",
+    "rightImpulse": "R Max Impulse (Ns)",
+    "notes": "Notas",
+}
+
+NORDBORD_ORDER = [
+    "Fecha Test", "Nombre", "Apellido", "Grupo", "Fecha de nacimiento", "Edad", "Dispositivo", "Test", "L Reps", "R Reps",
+    "L Max Force (N)", "R Max Force (N)", "Max Imbalance (%)", "L Max Torque (Nm)", "R Max Torque (Nm)",
+    "L Avg Force (N)", "R Avg Force (N)", "Avg Imbalance (%)", "L Max Impulse (Ns)", "R Max Impulse (Ns)",
+    "Impulse Imbalance (%)", "Notas",
+]
+
+# Columnas internas que no se muestran en la tabla de NordBord
+# (profileId y testId se conservan como claves; las páginas las ocultan)
+NORDBORD_DROP = [
+    "modifiedDateUtc", "testDateUtc", "testTypeId", "tenant_id",
+    "leftCalibration", "rightCalibration",
+]
+
+# Columnas de texto repetitivo que se guardan como diccionario (category)
+CATEGORY_COLUMNS = [
+    "Nombre", "Apellido", "Jugador", "Grupo", "Plantel", "Test", "Dispositivo",
+    "testTypeName", "testPositionName", "testType", "device",
+]
+
+# Definición de cada tabla: nombre del dispositivo, dataset de origen, columna con la fecha del test,
+# renombres, desbalances (nombre, columna izquierda, columna derecha),
+# columnas a eliminar, orden preferido, columnas usadas como filtro (facetas)
+# columna con el tipo de test (para los agregados), métricas clave con
+# serie longitudinal por atleta y, opcionalmente, el dataset de resultados
+# por trial que se agrega como columnas
+MARTS = {
+    "nordbord": {
+        "label": "NordBord",
+        "source": "nordbord",
+        "date": "testDateUtc",
+        "rename": NORDBORD_RENAME,
+        "imbalances": [
+            ("Max Imbalance (%)", "L Max Force (N)", "R Max Force (N)"),
+            ("Avg Imbalance (%)", "L Avg Force (N)", "R Avg Force (N)"),
+            ("Impulse Imbalance (%)", "L Max Impulse (Ns)", "R Max Impulse (Ns)"),
+        ],
+        "drop": NORDBORD_DROP,
+        "order": NORDBORD_ORDER,
+        "facets": ["Grupo", "Test", "Dispositivo", "Jugador"],
+        "test_column": "Test",
+        "trend": [
+            "L Max Force (N)", "R Max Force (N)", "Max Imbalance (%)",
+            "L Max Torque (Nm)", "R Max Torque (Nm)", "Avg Imbalance (%)",
+        ],
+    },
+    "forceframe": {
+        "label": "ForceFrame",
+        "source": "forceframe",
+        "date": "testDateUtc",
+        "rename": {},
+        "imbalances": [
+            ("Inner Max Imbalance (%)", "innerLeftMaxForce", "innerRightMaxForce"),
+            ("Outer Max Imbalance (%)", "outerLeftMaxForce", "outerRightMaxForce"),
+        ],
+        "drop": [],
+        "order": ["Fecha Test", "Nombre", "Apellido", "Grupo", "Fecha de nacimiento", "Edad"],
+        "facets": ["Grupo", "testTypeName", "testPositionName", "Jugador"],
+        "test_column": "testTypeName",
+        "trend": [
+            "innerLeftMaxForce", "innerRightMaxForce", "Inner Max Imbalance (%)",
+            "outerLeftMaxForce", "outerRightMaxForce", "Outer Max Imbalance (%)",
+        ],
+    },
+    "forcedecks": {
+        "label": "ForceDecks",
+        "source": "forcedecks",
+        "date": "recordedDateUtc",
+        "rename": {},
+        "imbalances": [],
+        # Campos anidados que solo tienen los CSV de versiones anteriores
+        "drop": list(FORCEDECKS_SCHEMA["nested"]),
+        "order": ["Fecha Test", "Nombre", "Apellido", "Grupo", "Fecha de nacimiento", "Edad"],
+        "facets": ["Grupo", "testType", "Jugador"],
+        "test_column": "testType",
+        "trend": ["weight"] + list(FORCEDECKS_RESULTS.values()),
+        "results": "forcedecks_results",
+    },
+}
+
+
+def mart_dir(output_dir=OUTPUT_DIR):
+    return Path(output_dir) / MART_DIR_NAME
+
+
+def mart_path(name, output_dir=OUTPUT_DIR):
+    """Ruta del Parquet de una tabla materializada."""
+    return mart_dir(output_dir) / f"{name}.parquet"
+
+
+def aggregates_path(output_dir=OUTPUT_DIR):
+    """Ruta del Parquet de agregados por bucket."""
+    return mart_dir(output_dir) / AGGREGATES_FILE
+
+
+def norms_path(output_dir=OUTPUT_DIR):
+    """Ruta del Parquet de digests normativos."""
+    return mart_dir(output_dir) / NORMS_FILE
+
+
+def longitudinal_path(output_dir=OUTPUT_DIR):
+    """Ruta del Parquet de series longitudinales por atleta."""
+    return mart_dir(output_dir) / LONGITUDINAL_FILE
+
+
+def test_index_path(output_dir=OUTPUT_DIR):
+    """Ruta del Parquet con el índice unificado de tests."""
+    return mart_dir(output_dir) / TEST_INDEX_FILE
+
+
+def mart_version(name, output_dir=OUTPUT_DIR):
+    """Versión de la tabla (mtime en ns) o None si no existe."""
+    try:
+        return mart_path(name, output_dir).stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def mart_is_stale(name, output_dir=OUTPUT_DIR):
+    """True si la tabla no existe o es más vieja que alguno de sus orígenes."""
+    path = mart_path(name, output_dir)
+    if not path.exists():
+        return True
+    sources = [MARTS[name]["source"], MARTS[name].get("results"), "profiles"] if name in MARTS else ["profiles"]
+    sources = [s for s in sources if s is not None]
+    versions = [v for v in (dataset_version(s, output_dir) for s in sources) if v is not None]
+    return bool(versions) and max(versions) > path.stat().st_mtime_ns
+
+
+def build_profiles_mart(df_profiles):
+    """Perfiles con nombres de columna limpios para la página de perfiles."""
+    df = df_profiles.rename(columns=PROFILE_RENAME).rename(columns={"Grupo": "Plantel"})
+    df["Fecha de nacimiento"] = to_date(df["Fecha de nacimiento"])
+    df = to_categories(df, CATEGORY_COLUMNS)
+    return df[["profileId", "Plantel", "Nombre", "Apellido", "Fecha de nacimiento"]]
+
+
+def build_tests_mart(name, df_tests, profiles=None):
+    """Cruza los tests con el índice de perfiles y agrega las métricas derivadas."""
+    spec = MARTS[name]
+    df = df_tests
+    if profiles is not None and len(profiles):
+        merged = profiles.enrich(df)
+        merged = merged.dropna(subset=["Nombre", "Apellido", "Fecha de nacimiento"])
+        # Si ningún test tiene perfil se deja la tabla sin enriquecer
+        if not merged.empty:
+            df = merged
+
+    df = df.rename(columns=spec["rename"])
+    df["Fecha Test"] = to_date(df[spec["date"]])
+    if "Nombre" in df.columns:
+        df["Edad"] = age_at(df["Fecha de nacimiento"], df["Fecha Test"])
+
+    for col, left, right in spec["imbalances"]:
+        if {left, right}.issubset(df.columns):
+            coerce_numeric(df, [left, right])
+            df[col] = imbalance_pct(df[left], df[right])
+
+    # Las métricas se leen en float32; la tabla final vuelve a float64 para que
+    # el redondeo a 2 decimales se muestre exacto en tablas y descargas
+    float_cols = df.select_dtypes(include="float32").columns
+    df[float_cols] = df[float_cols].astype("float64")
+    round_numeric(df)
+    to_categories(df, CATEGORY_COLUMNS)
+    df = df.drop(columns=[c for c in spec["drop"] if c in df.columns])
+
+    existing_cols = [c for c in spec["order"] if c in df.columns]
+    remaining_cols = [c for c in df.columns if c not in existing_cols]
+    return df[existing_cols + remaining_cols].reset_index(drop=True)
+
+
+def _write_parquet(df, path):
+    """Escritura atómica: las páginas nunca leen un archivo a medio escribir."""
+    with atomic_write(path) as tmp_path:
+        df.to_parquet(tmp_path, index=False)
+
+
+def update_aggregates(name, df_tests, df_mart, profiles, state):
+    """
+    Actualiza los buckets (utils/aggregates.py), los digests normativos
+    (utils/norms.py) y las series por atleta (utils/longitudinal.py) de
+    `name`. Los testId nuevos se suman a lo existente; si un test ya incluido
+    cambió (otra huella de la fila, p. ej. reanalizado) se recalculan desde la
+    tabla solo los buckets y grupos donde estaba y donde quedó. Si desapareció
+    algún test o cambiaron los perfiles (edad o plantel) se recalcula todo lo
+    de la tabla.
+    `state` tiene las claves "aggregates", "norms", "series" e "ids" (testId,
+    huella y bucket de cada test ya incluido) de todas las tablas y se
+    devuelve actualizado.
+    """
+    test_column = MARTS[name]["test_column"]
+    trend = MARTS[name]["trend"]
+    series = state["series"]
+    fingerprint = profiles.fingerprint if profiles is not None else ""
+    ids = df_tests["testId"].astype(str)
+    versions = pd.util.hash_pandas_object(df_tests, index=False).to_numpy()
+    mart_ids = df_mart["testId"].astype(str)
+    keys = bucket_keys(df_mart, test_column)
+
+    def _split(df):
+        if df is None:
+            return None, None
+        mine = df["Tabla"] == name
+        return df[mine], df[~mine]
+
+    own_agg, other_agg = _split(state["aggregates"])
+    own_norms, other_norms = _split(state["norms"])
+    seen, other_ids = _split(state["ids"])
+    incremental = (
+        own_agg is not None and own_norms is not None and seen is not None and not seen.empty
+        and "version" in seen.columns
+        and (seen["profiles"] == fingerprint).all()
+        and seen["testId"].isin(ids).all()
+    )
+    if incremental:
+        previous = seen.set_index("testId")["version"]
+        known = ids.isin(previous.index).to_numpy()
+        new_ids = ids[~known]
+        differs = previous.loc[ids[known]].to_numpy() != versions[known]
+        changed_ids = ids[known][differs]
+        fresh = mart_ids.isin(new_ids).to_numpy()
+        # Buckets donde estaban (según el estado) y donde quedaron los tests que cambiaron
+        touched = pd.concat(
+            [seen.loc[seen["testId"].isin(changed_ids), AGG_KEYS], keys[mart_ids.isin(changed_ids).to_numpy()]],
+            ignore_index=True,
+        )
+        redo = in_buckets(keys, touched)
+        own_agg = merge_aggregates(
+            own_agg[~in_buckets(own_agg, touched)],
+            partial_aggregates(name, df_mart[redo | fresh], test_column),
+        )
+        groups = touched[NORM_KEYS]
+        redo = in_buckets(keys, groups)
+        batch = df_mart[redo | fresh]
+        own_norms = merge_norms(
+            own_norms[~in_buckets(own_norms, groups)],
+            partial_norms(name, batch, test_column, metric_columns(batch)),
+        )
+        updated = mart_ids.isin(new_ids) | mart_ids.isin(changed_ids)
+        series = upsert(series, name, points(name, df_mart[updated.to_numpy()], trend), replaced=set(changed_ids))
+        log.info(f"✅ Agregados {name}: {len(new_ids)} tests nuevos, {len(changed_ids)} modificados")
+    else:
+        own_agg = partial_aggregates(name, df_mart, test_column)
+        own_norms = partial_norms(name, df_mart, test_column, metric_columns(df_mart))
+        series = replace_table(series, name, points(name, df_mart, trend))
+        log.info(f"✅ Agregados {name} recalculados")
+
+    ids_df = pd.DataFrame({"Tabla": name, "testId": ids.to_numpy(), "profiles": fingerprint, "version": versions})
+    placed = pd.concat([mart_ids.rename("testId"), keys], axis=1).drop_duplicates("testId")
+    ids_df = ids_df.merge(placed, on="testId", how="left")
+    return {
+        "aggregates": merge_aggregates(other_agg, own_agg),
+        "norms": merge_norms(other_norms, own_norms),
+        "series": series,
+        "ids": pd.concat([f for f in (other_ids, ids_df) if f is not None and not f.empty], ignore_index=True),
+    }
+
+
+def build_test_index(output_dir=OUTPUT_DIR):
+    """
+    Une los tests de todas las tablas materializadas en una sola tabla
+    (profileId, dispositivo, tipo de test, fecha y métricas clave) ordenada
+    por atleta y fecha.
+    """
+    frames = []
+    for name, spec in MARTS.items():
+        path = mart_path(name, output_dir)
+        if not path.exists():
+            continue
+        available = pq.read_schema(path).names
+        wanted = ["profileId", "testId", spec["test_column"], "Fecha Test"] + spec["trend"]
+        if not {"profileId", "testId", "Fecha Test"}.issubset(available):
+            continue
+        df = pd.read_parquet(path, columns=[c for c in wanted if c in available])
+        df = df.rename(columns={spec["test_column"]: "Test"})
+        df.insert(2, "Dispositivo", spec["label"])
+        frames.append(df.astype({"profileId": str, "testId": str, "Test": "string"}))
+    if not frames:
+        return None
+    df = pd.concat(frames, ignore_index=True)
+    df = df.sort_values(["profileId", "Fecha Test"]).reset_index(drop=True)
+    df = to_categories(df, ["profileId", "Dispositivo", "Test"])
+    _write_parquet(df, test_index_path(output_dir))
+    log.info(f"✅ Índice de tests actualizado ({len(df)} tests)")
+    return df
+
+
+def _with_results(spec, df_tests, output_dir):
+    """Agrega a los tests las columnas de resultados por trial (si la tabla tiene)."""
+    if not spec.get("results"):
+        return df_tests
+    df_results = read_dataset(spec["results"], output_dir)
+    if df_results is None or df_results.empty:
+        return df_tests
+    wide = results_wide(df_results)
+    ids = df_tests["testId"].astype(str)
+    wide = wide.set_index(wide["testId"].astype(str)).drop(columns="testId")
+    return pd.concat([df_tests, wide.reindex(ids).reset_index(drop=True)], axis=1)
+
+
+def _read_optional(path):
+    return pd.read_parquet(path) if path.exists() else None
+
+
+def build_marts(output_dir=OUTPUT_DIR, names=None, if_stale=False):
+    """
+    Materializa las tablas del dashboard a partir de los CSV extraídos. Con
+    if_stale solo las de `names` que siguen viejas una vez tomado el lock
+    (otro proceso pudo haberlas regenerado mientras se esperaba).
+    """
+    with file_lock(mart_dir(output_dir) / BUILD_LOCK_FILE):
+        if if_stale:
+            names = [n for n in (names or list(MARTS) + ["profiles"]) if mart_is_stale(n, output_dir)]
+            if not names:
+                return {}
+        return _build_marts(output_dir, names)
+
+
+def _build_marts(output_dir, names):
+    out = mart_dir(output_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    df_profiles = read_dataset("profiles", output_dir)
+    # El índice de perfiles se arma una sola vez y se usa en todas las tablas
+    profiles = ProfileIndex(df_profiles) if df_profiles is not None else None
+    built = {}
+    if df_profiles is not None and (names is None or "profiles" in names):
+        built["profiles"] = build_profiles_mart(df_profiles)
+    state = {
+        "aggregates": _read_optional(aggregates_path(output_dir)),
+        "norms": _read_optional(norms_path(output_dir)),
+        "series": _read_optional(longitudinal_path(output_dir)),
+        "ids": _read_optional(out / AGGREGATED_IDS_FILE),
+    }
+    updated = False
+    for name, spec in MARTS.items():
+        if names is not None and name not in names:
+            continue
+        df_tests = read_dataset(spec["source"], output_dir)
+        if df_tests is None or df_tests.empty:
+            continue
+        if "testId" in df_tests.columns:
+            # La paginación de la API puede repetir un test entre páginas
+            df_tests = df_tests.drop_duplicates("testId", keep="last").reset_index(drop=True)
+            df_tests = _with_results(spec, df_tests, output_dir)
+        built[name] = build_tests_mart(name, df_tests, profiles)
+        if "testId" in df_tests.columns:
+            state = update_aggregates(name, df_tests, built[name], profiles, state)
+            updated = True
+    for name, df in built.items():
+        _write_parquet(df, mart_path(name, output_dir))
+        log.info(f"✅ Tabla {name} materializada ({len(df)} filas)")
+    if updated:
+        for path, df in [
+            (aggregates_path(output_dir), state["aggregates"]),
+            (norms_path(output_dir), state["norms"]),
+            (longitudinal_path(output_dir), state["series"]),
+            (out / AGGREGATED_IDS_FILE, state["ids"]),
+        ]:
+            if df is not None:
+                _write_parquet(df, path)
+    if any(name in MARTS for name in built):
+        build_test_index(output_dir)
+    return built
@@ -0,0 +1,343 @@
+# utils/metrics.py
+"""
+Métricas de las corridas de extracción.
+
+Durante una corrida (collect) se registra:
+    - por etapa: duración, registros procesados y registros por segundo;
+    - por host y endpoint de la API (utils/http.py): requests, errores,
+      reintentos, bytes recibidos e histograma de latencia;
+    - por dispositivo: páginas y registros descargados.
+Al terminar se escriben en output_data/metrics un reporte JSON por corrida
+(más last_run.json con el último) y vald_extraction.prom en formato de texto
+de Prometheus (para el textfile collector de node_exporter).
+
+Fuera de una corrida no se registra nada: http.get solo mira si hay una
+corrida activa. Con VALD_PROFILE cada etapa además se perfila
+(utils/profiling.py) y el reporte incluye su pico de memoria.
+"""
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import pandas as pd
+
+from utils import profiling
+from utils.schemas import OUTPUT_DIR
+
+METRICS_DIR_NAME = "metrics"
+LAST_RUN_FILE = "last_run.json"
+PROM_FILE = "vald_extraction.prom"
+
+# Límites superiores (segundos) de los buckets del histograma de latencia
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Segmentos de ruta que son ids (UUID, hex o números): se agrupan como {id}
+_ID_SEGMENT = re.compile(r"/(?:[0-9a-fA-F]{8}-[0-9a-fA-F-]{27,}|[0-9a-fA-F]{16,}|\d+)(?=/|$)")
+
+_current = None
+
+
+def metrics_dir(output_dir=OUTPUT_DIR):
+    return Path(output_dir) / METRICS_DIR_NAME
+
+
+def endpoint_of(url):
+    """(host, ruta con los ids reemplazados por {id}) de una URL."""
+    parts = urlsplit(url)
+    return parts.netloc, _ID_SEGMENT.sub("/{id}", parts.path) or "/"
+
+
+class Histogram:
+    """Histograma acumulativo con buckets fijos (como los de Prometheus)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # el último es +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """[(le, cantidad acumulada)] incluyendo +Inf."""
+        total, out = 0, []
+        for upper, n in zip(list(self.buckets) + [float("inf")], self.counts):
+            total += n
+            out.append((upper, total))
+        return out
+
+    def quantile(self, q):
+        """Estimación del cuantil q por interpolación lineal dentro del bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        lower, previous = 0.0, 0
+        for upper, total in self.cumulative():
+            if total >= rank:
+                if upper == float("inf"):
+                    return lower
+                inside = total - previous
+                return lower + (upper - lower) * ((rank - previous) / inside if inside else 0)
+            lower, previous = upper, total
+        return lower
+
+
+class Stage:
+    """Etapa en curso: se le pueden sumar registros (`stage.records += n`)."""
+
+    def __init__(self, name):
+        self.name = name
+        self.records = 0
+        self.seconds = 0.0
+        self.peak_mb = None
+
+
+class RunMetrics:
+    """Métricas de una corrida (seguras entre hilos)."""
+
+    def __init__(self, output_dir=OUTPUT_DIR, **labels):
+        self.output_dir = Path(output_dir)
+        self.labels = labels
+        self.started = datetime.now(timezone.utc)
+        self.run_id = self.started.astimezone().strftime("%Y%m%d_%H%M%S")
+        self._t0 = time.perf_counter()
+        self.seconds = None
+        self.state = "running"
+        self.stages = []
+        self.requests = {}  # (host, endpoint) -> dict
+        self.counters = {}  # (métrica, clave) -> valor
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """Mide la duración de una etapa del pipeline (y la perfila si VALD_PROFILE)."""
+        stage = Stage(name)
+        directory = profiling.profiles_dir(self.output_dir) / f"run_{self.run_id}"
+        with profiling.profile(name, directory) as profile:
+            t0 = time.perf_counter()
+            try:
+                yield stage
+            finally:
+                stage.seconds = time.perf_counter() - t0
+                with self._lock:
+                    self.stages.append(stage)
+        stage.peak_mb = profile.get("peak_mb")
+
+    def observe_request(self, url, seconds, status=None, size=0, retries=0):
+        key = endpoint_of(url)
+        with self._lock:
+            entry = self.requests.get(key)
+            if entry is None:
+                entry = self.requests[key] = {"requests": 0, "errors": 0, "retries": 0, "bytes": 0, "latency": Histogram()}
+            entry["requests"] += 1
+            entry["errors"] += status is None or status >= 400
+            entry["retries"] += retries
+            entry["bytes"] += size
+            entry["latency"].observe(seconds)
+
+    def count(self, metric, key, value=1):
+        """Suma `value` al contador `metric` de `key` (p. ej. páginas por dispositivo)."""
+        with self._lock:
+            self.counters[(metric, key)] = self.counters.get((metric, key), 0) + value
+
+    # --- reporte ---
+
+    def report(self):
+        """Resumen de la corrida como dict (lo que se guarda en el JSON)."""
+        seconds = self.seconds if self.seconds is not None else time.perf_counter() - self._t0
+        with self._lock:
+            stages = [
+                {
+                    "stage": s.name,
+                    "seconds": round(s.seconds, 3),
+                    "records": s.records,
+                    "records_per_s": round(s.records / s.seconds, 1) if s.seconds and s.records else None,
+                    "peak_mb": s.peak_mb,
+                }
+                for s in self.stages
+            ]
+            hosts = []
+            for (host, endpoint), e in sorted(self.requests.items()):
+                latency = e["latency"]
+                hosts.append({
+                    "host": host,
+                    "endpoint": endpoint,
+                    "requests": e["requests"],
+                    "errors": e["errors"],
+                    "retries": e["retries"],
+                    "bytes": e["bytes"],
+                    "latency_sum_s": round(latency.sum, 3),
+                    "latency_p50_s": _round(latency.quantile(0.5)),
+                    "latency_p95_s": _round(latency.quantile(0.95)),
+                    "latency_buckets": [[_le(le), n] for le, n in latency.cumulative()],
+                })
+            counters = {}
+            for (metric, key), value in sorted(self.counters.items()):
+                counters.setdefault(metric, {})[key] = value
+        return {
+            **self.labels,
+            "state": self.state,
+            "started": self.started.isoformat(timespec="seconds"),
+            "seconds": round(seconds, 3),
+            "stages": stages,
+            "http": hosts,
+            "counters": counters,
+        }
+
+    def prometheus(self):
+        """Texto en formato de exposición de Prometheus."""
+        report = self.report()
+        lines = [
+            "# HELP vald_extraction_duration_seconds Duración de la última extracción.",
+            "# TYPE vald_extraction_duration_seconds gauge",
+            f"vald_extraction_duration_seconds {report['seconds']}",
+            "# HELP vald_extraction_success 1 si la última extracción terminó bien.",
+            "# TYPE vald_extraction_success gauge",
+            f"vald_extraction_success {int(report['state'] == 'done')}",
+            "# HELP vald_extraction_last_run_timestamp_seconds Inicio de la última extracción (epoch).",
+            "# TYPE vald_extraction_last_run_timestamp_seconds gauge",
+            f"vald_extraction_last_run_timestamp_seconds {self.started.timestamp():.0f}",
+            "# HELP vald_extraction_stage_seconds Duración de cada etapa.",
+            "# TYPE vald_extraction_stage_seconds gauge",
+        ]
+        lines += [f'vald_extraction_stage_seconds{{stage="{s["stage"]}"}} {s["seconds"]}' for s in report["stages"]]
+        lines += [
+            "# HELP vald_extraction_stage_records Registros procesados en cada etapa.",
+            "# TYPE vald_extraction_stage_records gauge",
+        ]
+        lines += [f'vald_extraction_stage_records{{stage="{s["stage"]}"}} {s["records"]}' for s in report["stages"]]
+        peaks = [s for s in report["stages"] if s["peak_mb"] is not None]
+        if peaks:
+            lines += [
+                "# HELP vald_extraction_stage_peak_megabytes Pico de memoria de cada etapa (VALD_PROFILE=mem).",
+                "# TYPE vald_extraction_stage_peak_megabytes gauge",
+            ]
+            lines += [f'vald_extraction_stage_peak_megabytes{{stage="{s["stage"]}"}} {s["peak_mb"]}' for s in peaks]
+        for metric, values in report["counters"].items():
+            lines += [f"# TYPE vald_extraction_{metric}_total counter"]
+            lines += [f'vald_extraction_{metric}_total{{device="{k}"}} {v}' for k, v in values.items()]
+        for name, field, help_text in [
+            ("requests", "requests", "Requests HTTP a la API."),
+            ("errors", "errors", "Requests con error (HTTP >= 400 o sin respuesta)."),
+            ("retries", "retries", "Reintentos automáticos (429/5xx)."),
+            ("response_bytes", "bytes", "Bytes recibidos."),
+        ]:
+            lines += [f"# HELP vald_http_{name}_total {help_text}", f"# TYPE vald_http_{name}_total counter"]
+            lines += [f'vald_http_{name}_total{{{_labels(h)}}} {h[field]}' for h in report["http"]]
+        lines += [
+            "# HELP vald_http_request_duration_seconds Latencia de los requests (incluye reintentos y cuerpo).",
+            "# TYPE vald_http_request_duration_seconds histogram",
+        ]
+        for h in report["http"]:
+            labels = _labels(h)
+            lines += [f'vald_http_request_duration_seconds_bucket{{{labels},le="{le}"}} {n}' for le, n in h["latency_buckets"]]
+            lines.append(f"vald_http_request_duration_seconds_sum{{{labels}}} {h['latency_sum_s']}")
+            lines.append(f"vald_http_request_duration_seconds_count{{{labels}}} {h['requests']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        """Escribe el reporte JSON (por corrida y last_run.json) y el archivo .prom."""
+        out = metrics_dir(self.output_dir)
+        out.mkdir(parents=True, exist_ok=True)
+        text = json.dumps(self.report(), ensure_ascii=False, indent=1)
+        _write_atomic(out / f"run_{self.run_id}.json", text)
+        _write_atomic(out / LAST_RUN_FILE, text)
+        _write_atomic(out / PROM_FILE, self.prometheus())
+
+
+def _round(value):
+    return round(value, 4) if value is not None else None
+
+
+def _le(upper):
+    return "+Inf" if upper == float("inf") else upper
+
+
+def _labels(h):
+    return f'host="{h["host"]}",endpoint="{h["endpoint"]}"'
+
+
+def _write_atomic(path, text):
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    tmp_path.write_text(text, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def current():
+    """Corrida activa o None."""
+    return _current
+
+
+@contextmanager
+def collect(output_dir=OUTPUT_DIR, **labels):
+    """
+    Corrida de métricas: activa durante el bloque y escrita al salir (también
+    si el bloque falla, con state="error").
+    """
+    global _current
+    run = RunMetrics(output_dir, **labels)
+    _current = run
+    try:
+        yield run
+        run.state = "done"
+    except BaseException:
+        run.state = "error"
+        raise
+    finally:
+        run.seconds = time.perf_counter() - run._t0
+        _current = None
+        run.write()
+
+
+@contextmanager
+def stage(name):
+    """Etapa de la corrida activa (sin corrida activa solo devuelve un Stage suelto)."""
+    run = _current
+    if run is None:
+        yield Stage(name)
+        return
+    with run.stage(name) as s:
+        yield s
+
+
+def count(metric, key, value=1):
+    run = _current
+    if run is not None:
+        run.count(metric, key, value)
+
+
+def load_last_report(output_dir=OUTPUT_DIR):
+    """Reporte de la última corrida (dict) o None."""
+    try:
+        return json.loads((metrics_dir(output_dir) / LAST_RUN_FILE).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def report_tables(report):
+    """(etapas, requests por host/endpoint) del reporte como DataFrames para la UI."""
+    stages = pd.DataFrame(report.get("stages", []), columns=["stage", "seconds", "records", "records_per_s", "peak_mb"])
+    stages.columns = ["Etapa", "Segundos", "Registros", "Registros/s", "Pico MB"]
+    if stages["Pico MB"].isna().all():
+        # Solo hay pico de memoria con VALD_PROFILE=mem
+        stages = stages.drop(columns="Pico MB")
+    hosts = pd.DataFrame(report.get("http", []))
+    if not hosts.empty:
+        hosts = hosts[["host", "endpoint", "requests", "errors", "retries", "bytes", "latency_p50_s", "latency_p95_s"]]
+        hosts["bytes"] = (hosts["bytes"] / 1024 ** 2).round(2)
+        hosts.columns = ["Host", "Endpoint", "Requests", "Errores", "Reintentos", "MB", "p50 (s)", "p95 (s)"]
+    return stages, hosts
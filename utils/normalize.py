@@ -0,0 +1,150 @@
+# utils/normalize.py
+"""
+Normalización de los tests de ForceDecks.
+
+La API devuelve campos anidados (listas de parámetros y atributos, un
+objeto "parameter") y offsets de zona horaria en minutos. En lugar de
+guardar esos campos como texto en all_forcedecks.csv, el normalizador:
+    - aplana los campos anidados en tablas laterales en formato largo
+      (una fila por elemento, con testId como clave);
+    - parsea solo las columnas que son fechas reales, con formato explícito;
+    - deja los offsets como minutos enteros.
+
+Los CSV generados por versiones anteriores tienen los campos anidados como
+repr de Python y los offsets como fechas de 1969. Para leerlos alcanza con
+parse_offsets (utils/schemas.py lo aplica al leer); migrate_forcedecks los
+reescribe en el formato nuevo y solo lo llama la extracción, antes de
+agregar tests a un archivo viejo.
+"""
+import ast
+import os
+
+import pandas as pd
+
+from utils import logs
+
+log = logs.get_logger("normalize")
+
+# Esquema de ForceDecks: qué es fecha, qué es offset y qué está anidado
+FORCEDECKS_SCHEMA = {
+    "timestamps": ["modifiedDateUtc", "recordedDateUtc", "analysedDateUtc"],
+    "offsets": ["recordedDateOffset", "analysedDateOffset"],
+    # columna anidada -> tabla lateral
+    "nested": {
+        "extendedParameters": "parameters",
+        "parameter": "parameters",
+        "attributes": "attributes",
+    },
+}
+
+# Archivos de las tablas laterales
+SIDE_FILES = {
+    "parameters": "all_forcedecks_parameters.csv",
+    "attributes": "all_forcedecks_attributes.csv",
+}
+
+_EPOCH = pd.Timestamp("1970-01-01")
+
+
+def _as_objects(series):
+    """
+    Devuelve los valores como listas/dicts. Los textos (CSV viejos) se
+    evalúan una sola vez por valor distinto, no por celda.
+    """
+    is_text = series.map(lambda v: isinstance(v, str))
+    if not is_text.any():
+        return series
+    parsed = {text: ast.literal_eval(text) for text in series[is_text].unique()}
+    return series.where(~is_text, series[is_text].map(parsed))
+
+
+def flatten(df, column, key="testId"):
+    """Tabla larga (key + campos de cada elemento) de una columna anidada."""
+    if column not in df.columns:
+        return pd.DataFrame(columns=[key])
+    values = _as_objects(df[column].dropna())
+    # Un objeto suelto se trata como lista de un elemento
+    values = values.map(lambda v: [v] if isinstance(v, dict) else v)
+    long = pd.DataFrame({key: df.loc[values.index, key], column: values}).explode(column)
+    long = long.dropna(subset=[column])
+    if long.empty:
+        return pd.DataFrame(columns=[key])
+    fields = pd.json_normalize(long[column].tolist())
+    fields.insert(0, key, long[key].to_numpy())
+    return fields
+
+
+def parse_timestamps(df, columns):
+    """Parsea solo las columnas de fecha indicadas (ISO 8601, UTC)."""
+    for col in columns:
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], errors="coerce", utc=True, format="ISO8601")
+    return df
+
+
+def parse_offsets(df, columns):
+    """
+    Offsets de zona horaria en minutos enteros. Los CSV viejos los tienen
+    como fechas cercanas a 1970 (los minutos quedaron como nanosegundos).
+    """
+    for col in columns:
+        if col not in df.columns:
+            continue
+        s = df[col]
+        if pd.api.types.is_numeric_dtype(s):
+            df[col] = s.astype("Int16")
+            continue
+        numeric = pd.to_numeric(s, errors="coerce")
+        legacy = numeric.isna() & s.notna()
+        if legacy.any():
+            stamps = pd.to_datetime(s[legacy], errors="coerce", format="ISO8601")
+            numeric[legacy] = (stamps - _EPOCH) // pd.Timedelta(1, "ns")
+        df[col] = numeric.round().astype("Int16")
+    return df
+
+
+def normalize_forcedecks(df, schema=FORCEDECKS_SCHEMA):
+    """
+    Devuelve (tests, tablas laterales). `tests` no tiene columnas anidadas;
+    cada tabla lateral tiene testId, Origen (columna de origen) y los campos.
+    """
+    df = df.copy()
+    parse_timestamps(df, schema["timestamps"])
+    parse_offsets(df, schema["offsets"])
+    sides = {}
+    for column, table in schema["nested"].items():
+        flat = flatten(df, column)
+        if len(flat):
+            flat.insert(1, "Origen", column)
+            sides.setdefault(table, []).append(flat)
+    sides = {table: pd.concat(frames, ignore_index=True) for table, frames in sides.items()}
+    tests = df.drop(columns=[c for c in schema["nested"] if c in df.columns])
+    return tests, sides
+
+
+def save_forcedecks(df, output_dir):
+    """Normaliza y guarda all_forcedecks.csv y sus tablas laterales."""
+    tests, sides = normalize_forcedecks(df)
+    tests.to_csv(os.path.join(output_dir, "all_forcedecks.csv"), index=False)
+    for table, filename in SIDE_FILES.items():
+        side = sides.get(table, pd.DataFrame(columns=["testId", "Origen"]))
+        side.to_csv(os.path.join(output_dir, filename), index=False)
+    return tests, sides
+
+
+def migrate_forcedecks(output_dir):
+    """
+    Convierte un all_forcedecks.csv de versiones anteriores (campos anidados
+    como texto) al formato normalizado. No hace nada si ya está normalizado.
+    """
+    path = os.path.join(output_dir, "all_forcedecks.csv")
+    if not os.path.exists(path):
+        return False
+    header = pd.read_csv(path, nrows=0).columns
+    if not any(c in header for c in FORCEDECKS_SCHEMA["nested"]):
+        return False
+    # Todo como texto: el normalizador decide el tipo de cada columna
+    df = pd.read_csv(path, dtype=str)
+    save_forcedecks(df, output_dir)
+    log.info("✅ all_forcedecks.csv normalizado (campos anidados en tablas laterales)")
+    return True
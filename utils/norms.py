@@ -0,0 +1,178 @@
+# utils/norms.py
+"""
+Datos normativos: percentiles por tipo de test, métrica, edad y plantel.
+
+Cada grupo guarda un t-digest (centroides media/peso con resolución mayor
+en las colas), que se puede combinar con otros: los tests nuevos de una
+sincronización se resumen aparte y se fusionan con los existentes, y las
+consultas por varios planteles o edades fusionan los digests del filtro.
+Buscar un percentil cuesta lo mismo sin importar el tamaño del historial.
+"""
+import numpy as np
+import pandas as pd
+
+# Dimensiones de cada grupo normativo
+KEYS = ["Test", "Grupo", "Edad"]
+
+# Percentiles que se muestran como bandas
+BANDS = [10, 25, 50, 75, 90]
+
+# Compresión del t-digest (~COMPRESSION / 2 centroides por grupo)
+COMPRESSION = 200
+
+
+class TDigest:
+    """t-digest combinable sobre arrays de NumPy."""
+
+    def __init__(self, means=(), weights=(), vmin=np.nan, vmax=np.nan, compression=COMPRESSION):
+        self.means = np.asarray(means, dtype="float64")
+        self.weights = np.asarray(weights, dtype="float64")
+        self.min = float(vmin)
+        self.max = float(vmax)
+        self.compression = compression
+
+    @classmethod
+    def from_values(cls, values, compression=COMPRESSION):
+        values = np.asarray(values, dtype="float64")
+        values = values[~np.isnan(values)]
+        digest = cls(compression=compression)
+        return digest.update(values)
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+    def update(self, values):
+        """Agrega valores sueltos (peso 1 cada uno)."""
+        values = np.asarray(values, dtype="float64")
+        if not len(values):
+            return self
+        return self._absorb(values, np.ones(len(values)), values.min(), values.max())
+
+    def merge(self, other):
+        """Fusiona otro digest en este."""
+        if not len(other.means):
+            return self
+        return self._absorb(other.means, other.weights, other.min, other.max)
+
+    def _absorb(self, means, weights, vmin, vmax):
+        means = np.concatenate([self.means, means])
+        weights = np.concatenate([self.weights, weights])
+        self.min = np.nanmin([self.min, vmin])
+        self.max = np.nanmax([self.max, vmax])
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        # Función de escala k1: los centroides que caen en el mismo entero de
+        # k(q) se fusionan, con más resolución cerca de q=0 y q=1
+        total = weights.sum()
+        q = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        group = np.floor(k - k[0]).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+        merged_w = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / merged_w
+        self.weights = merged_w
+        return self
+
+    def _knots(self):
+        """Posiciones (cuantil, valor) para interpolar, con mínimo y máximo exactos."""
+        total = self.weights.sum()
+        centers = (np.cumsum(self.weights) - self.weights / 2) / total
+        return np.r_[0.0, centers, 1.0], np.r_[self.min, self.means, self.max]
+
+    def quantile(self, q):
+        """Valor en el cuantil q (0-1) o NaN si el digest está vacío."""
+        if not len(self.means):
+            return np.nan
+        qs, values = self._knots()
+        return float(np.interp(q, qs, values))
+
+    def percentile_of(self, value):
+        """Percentil (0-100) de `value` dentro de la distribución."""
+        if not len(self.means) or value is None or np.isnan(value):
+            return np.nan
+        qs, values = self._knots()
+        return float(np.interp(value, values, qs) * 100)
+
+
+def _to_row(digest):
+    return {
+        "N": int(digest.count),
+        "Min": digest.min,
+        "Max": digest.max,
+        "Medias": digest.means.tolist(),
+        "Pesos": digest.weights.tolist(),
+    }
+
+
+def _from_row(row):
+    return TDigest(row["Medias"], row["Pesos"], row["Min"], row["Max"])
+
+
+def partial_norms(name, df, test_column, metrics):
+    """Un digest por (test, plantel, edad, métrica) de un lote de tests ya enriquecidos."""
+    if not {"Grupo", "Edad"}.issubset(df.columns) or test_column not in df.columns:
+        return None
+    keys = pd.DataFrame({
+        "Test": df[test_column].astype("string"),
+        "Grupo": df["Grupo"].astype("string"),
+        "Edad": df["Edad"].astype("Int64"),
+    })
+    rows = []
+    for key, pos in keys.groupby(KEYS, dropna=True).indices.items():
+        for metric in metrics:
+            values = df[metric].iloc[pos].to_numpy(dtype="float64", na_value=np.nan)
+            if np.isnan(values).all():
+                continue
+            rows.append({"Tabla": name, **dict(zip(KEYS, key)), "Métrica": metric,
+                         **_to_row(TDigest.from_values(values))})
+    return pd.DataFrame(rows) if rows else None
+
+
+def merge_norms(*frames):
+    """Fusiona tablas de digests con las mismas claves."""
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames:
+        return None
+    df = pd.concat(frames, ignore_index=True)
+    rows = []
+    for key, group in df.groupby(["Tabla"] + KEYS + ["Métrica"], dropna=False, observed=True):
+        digest = _from_row(group.iloc[0])
+        for _, row in group.iloc[1:].iterrows():
+            digest.merge(_from_row(row))
+        rows.append({**dict(zip(["Tabla"] + KEYS + ["Métrica"], key)), **_to_row(digest)})
+    return pd.DataFrame(rows)
+
+
+def _select(digests, name, metric, filters):
+    df = digests[(digests["Tabla"] == name) & (digests["Métrica"] == metric)]
+    for col, values in (filters or {}).items():
+        if col in KEYS and values is not None and len(values):
+            df = df[df[col].isin(list(values))]
+    return df
+
+
+def _combine(df):
+    digest = TDigest()
+    for _, row in df.iterrows():
+        digest.merge(_from_row(row))
+    return digest
+
+
+def bands(digests, name, metric, by="Edad", filters=None):
+    """
+    Percentiles BANDS de `metric` por `by` (fusionando los demás grupos del
+    filtro). `digests` es la tabla de norms.parquet ya cargada.
+    """
+    df = _select(digests, name, metric, filters)
+    rows = []
+    for value, group in df.groupby(by, observed=True):
+        digest = _combine(group)
+        rows.append({by: value, "N": int(digest.count),
+                     **{f"P{p}": digest.quantile(p / 100) for p in BANDS}})
+    return pd.DataFrame(rows, columns=[by, "N"] + [f"P{p}" for p in BANDS])
+
+
+def percentile_of(digests, name, metric, value, filters=None):
+    """Percentil de `value` frente a la norma del filtro (p. ej. mismo test, plantel y edad)."""
+    return _combine(_select(digests, name, metric, filters)).percentile_of(value)
@@ -0,0 +1,110 @@
+# utils/profile_index.py
+"""
+Índice de perfiles de atletas.
+
+Se construye una vez por sincronización a partir de all_profiles.csv y
+resuelve en O(1) las búsquedas por profileId, nombre de jugador y plantel.
+El pipeline lo usa para enriquecer los tests con los datos del perfil y las
+páginas para armar las listas de opciones del filtro de jugador.
+"""
+import numpy as np
+import pandas as pd
+
+from utils.transforms import full_name, to_categories, to_date
+
+# Columnas del perfil que se agregan a cada test
+PROFILE_RENAME = {
+    "givenName": "Nombre",
+    "familyName": "Apellido",
+    "dateOfBirth": "Fecha de nacimiento",
+    "groupName": "Grupo",
+}
+
+PROFILE_COLUMNS = ["Nombre", "Apellido", "Fecha de nacimiento", "Grupo", "Jugador"]
+
+
+class ProfileIndex:
+    """Perfiles indexados por profileId, con índices secundarios por jugador y plantel."""
+
+    def __init__(self, df_profiles):
+        df = df_profiles.dropna(subset=["profileId"]).drop_duplicates("profileId")
+        df = df[["profileId"] + list(PROFILE_RENAME)].rename(columns=PROFILE_RENAME)
+        df["Fecha de nacimiento"] = to_date(df["Fecha de nacimiento"])
+        df["Jugador"] = full_name(df["Nombre"], df["Apellido"])
+        to_categories(df, ["Nombre", "Apellido", "Grupo", "Jugador"])
+
+        self._ids = pd.Index(df["profileId"].astype(str), name="profileId")
+        self._records = df[PROFILE_COLUMNS].reset_index(drop=True)
+        # Índices secundarios: valor -> posiciones en _records
+        self._by_name = self._positions(self._records["Jugador"])
+        self._by_group = self._positions(self._records["Grupo"])
+        # Huella del contenido: cambia si cambia algún dato de algún perfil
+        hashes = pd.util.hash_pandas_object(self._records.assign(profileId=self._ids.to_numpy()), index=False)
+        self.fingerprint = f"{int(hashes.sum()) & 0xFFFFFFFFFFFFFFFF:016x}"
+
+    @staticmethod
+    def _positions(series):
+        return {key: np.asarray(pos) for key, pos in series.groupby(series, observed=True).indices.items()}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, profile_id):
+        return profile_id in self._ids
+
+    def get(self, profile_id):
+        """Registro del atleta (dict) o None si el profileId no existe."""
+        try:
+            pos = self._ids.get_loc(profile_id)
+        except KeyError:
+            return None
+        return {"profileId": profile_id, **self._records.iloc[pos].to_dict()}
+
+    def _lookup(self, profile_ids):
+        """Posición de cada profileId en el índice (-1 si no existe)."""
+        if isinstance(profile_ids.dtype, pd.CategoricalDtype):
+            # Solo se buscan las categorías distintas; las filas usan sus códigos enteros
+            cats = self._ids.get_indexer(profile_ids.cat.categories.astype(str))
+            codes = profile_ids.cat.codes.to_numpy()
+            return np.where(codes >= 0, cats[codes], -1)
+        return self._ids.get_indexer(profile_ids.astype(str))
+
+    def enrich(self, df, on="profileId", columns=PROFILE_COLUMNS):
+        """
+        Agrega a `df` las columnas del perfil (left join por `on`).
+        Los tests sin perfil quedan con valores nulos.
+        """
+        pos = self._lookup(df[on])
+        found = self._records[list(columns)].reindex(pos)
+        found.index = df.index
+        return pd.concat([df, found], axis=1)
+
+    def ids_for_name(self, name):
+        """profileIds con ese nombre de jugador (puede haber homónimos)."""
+        return self._ids[self._by_name.get(name, [])].tolist()
+
+    def ids_for_groups(self, groups):
+        """profileIds que pertenecen a alguno de los planteles."""
+        pos = [self._by_group[g] for g in groups if g in self._by_group]
+        return self._ids[np.concatenate(pos)].tolist() if pos else []
+
+    def groups(self):
+        """Planteles ordenados."""
+        return sorted(self._by_group)
+
+    def names(self, groups=None):
+        """Jugadores ordenados, opcionalmente solo de los planteles indicados."""
+        if not groups:
+            return sorted(self._by_name)
+        pos = [self._by_group[g] for g in groups if g in self._by_group]
+        if not pos:
+            return []
+        return sorted(self._records["Jugador"].iloc[np.concatenate(pos)].dropna().unique())
+
+    def frame(self, profile_ids=None):
+        """Registros como DataFrame (todos o los de `profile_ids`), con profileId."""
+        df = self._records.assign(profileId=self._ids.to_numpy())
+        if profile_ids is not None:
+            pos = self._ids.get_indexer(pd.Index(profile_ids).astype(str))
+            df = df.iloc[pos[pos >= 0]]
+        return df[["profileId"] + PROFILE_COLUMNS]
@@ -0,0 +1,253 @@
+# utils/profiling.py
+"""
+Perfilado opcional de las etapas de la extracción y de los loaders del
+dashboard.
+
+Se activa con VALD_PROFILE (o --profile en la línea de comandos), una lista
+de modos separados por coma:
+    - cpu: cProfile del hilo que ejecuta la etapa (.prof para pstats o
+      snakeviz y .txt con las funciones de mayor tiempo acumulado); uno a
+      la vez por proceso: un bloque que empieza mientras otro perfila cpu
+      se perfila sin cpu;
+    - sample: muestreo de las pilas de TODOS los hilos cada SAMPLE_INTERVAL
+      (.folded, el formato de flamegraph.pl y speedscope): muestra el trabajo
+      de los hilos de descarga, que cProfile no ve;
+    - mem: tracemalloc: pico de memoria de la etapa (también en el reporte de
+      utils/metrics.py) y los sitios que más memoria retienen al terminar
+      (.mem.txt);
+    - 1 / all: todos.
+Los archivos quedan en output_data/profiles/run_<corrida>/ (etapas) y
+output_data/profiles/dashboard/ (loaders, solo las llamadas que tardan más
+de LOADER_MIN_SECONDS). Los procesos del PagePool no se perfilan.
+
+Desactivado casi no cuesta nada: profile() es un nullcontext y los loaders
+de profiled() solo consultan enabled() en cada llamada (así --profile o
+configure() valen aunque se llamen después de importar los loaders).
+"""
+import cProfile
+import functools
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+
+from utils import logs
+from utils.schemas import OUTPUT_DIR
+
+PROFILES_DIR_NAME = "profiles"
+
+MODES = ("cpu", "sample", "mem")
+
+# Segundos entre muestras de pilas, funciones del resumen de cProfile,
+# sitios del resumen de memoria y duración mínima de un loader para guardarlo
+SAMPLE_INTERVAL = 0.005
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+LOADER_MIN_SECONDS = 0.1
+
+_MB = 1024 ** 2
+
+log = logs.get_logger("profiling")
+
+_modes = None
+_local = threading.local()
+# Desde Python 3.12 solo puede haber un cProfile activo por proceso: si otro
+# hilo ya perfila cpu (una etapa del trabajo y un loader a la vez), el
+# segundo bloque se perfila sin cpu
+_cpu_lock = threading.Lock()
+_mem_lock = threading.Lock()
+_mem_users = 0
+
+
+def parse_modes(value):
+    """Conjunto de modos a partir del texto de VALD_PROFILE / --profile."""
+    items = {m.strip().lower() for m in (value or "").split(",") if m.strip()}
+    if items & {"1", "all", "true"}:
+        return set(MODES)
+    unknown = items - set(MODES) - {"0", "false"}
+    if unknown:
+        raise ValueError(f"Modos de perfilado desconocidos: {', '.join(sorted(unknown))}")
+    return items & set(MODES)
+
+
+def configure(value=None):
+    """Modos activos (por defecto los de VALD_PROFILE)."""
+    global _modes
+    _modes = parse_modes(value if value is not None else os.getenv("VALD_PROFILE"))
+    return _modes
+
+
+def modes():
+    return _modes if _modes is not None else configure()
+
+
+def enabled():
+    return bool(modes())
+
+
+def profiles_dir(output_dir=OUTPUT_DIR):
+    return Path(output_dir) / PROFILES_DIR_NAME
+
+
+class StackSampler(threading.Thread):
+    """Cuenta las pilas de todos los hilos (menos el propio) cada `interval` segundos."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__(name="profiling-sampler", daemon=True)
+        self.interval = interval
+        self.counts = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            # Los hilos de un pool se agrupan (ThreadPoolExecutor-0_3 -> ThreadPoolExecutor-0)
+            names = {t.ident: re.sub(r"_\d+$", "", t.name) for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, "thread"))
+                self.counts[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def folded(self):
+        return "\n".join(f"{stack} {n}" for stack, n in self.counts.most_common()) + "\n"
+
+
+def _mem_start():
+    # tracemalloc es global: se mantiene activo mientras algún perfil lo use
+    global _mem_users
+    with _mem_lock:
+        if _mem_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _mem_users += 1
+        tracemalloc.reset_peak()
+        return tracemalloc.get_traced_memory()[0]
+
+
+def _mem_stop(snapshot):
+    global _mem_users
+    with _mem_lock:
+        peak = tracemalloc.get_traced_memory()[1]
+        taken = tracemalloc.take_snapshot() if snapshot else None
+        _mem_users -= 1
+        if _mem_users == 0:
+            tracemalloc.stop()
+        return peak, taken
+
+
+def _artifact_base(directory, name):
+    """Ruta base sin extensión; si la etapa se repite (un tenant por vez) se numera."""
+    base, n = directory / name, 1
+    while any(base.parent.glob(base.name + ".*")):
+        n += 1
+        base = directory / f"{name}_{n}"
+    return base
+
+
+def _save(directory, name, profiler, sampler, snapshot, result):
+    directory.mkdir(parents=True, exist_ok=True)
+    base = _artifact_base(directory, name)
+    if profiler is not None:
+        profiler.dump_stats(f"{base}.prof")
+        with open(f"{base}.txt", "w", encoding="utf-8") as f:
+            stats = pstats.Stats(profiler, stream=f)
+            stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+    if sampler is not None and sampler.counts:
+        Path(f"{base}.folded").write_text(sampler.folded(), encoding="utf-8")
+    if snapshot is not None:
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        lines = [
+            f"{name}: pico {result['peak_mb']} MB durante la etapa",
+            "Memoria retenida al terminar, por sitio:",
+        ]
+        lines += [str(s) for s in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]]
+        Path(f"{base}.mem.txt").write_text("\n".join(lines) + "\n", encoding="utf-8")
+    log.info(f"🔬 Perfil de {name}: {base}.*")
+
+
+@contextmanager
+def _profile(name, directory, sample, min_seconds):
+    active = modes()
+    _local.active = True
+    result = {}
+    profiler = None
+    if "cpu" in active:
+        if _cpu_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+        else:
+            log.info(f"🔬 {name}: sin perfil cpu (hay otro perfil cpu en curso)")
+    sampler = StackSampler() if sample and "sample" in active else None
+    base_memory = _mem_start() if "mem" in active else None
+    if sampler is not None:
+        sampler.start()
+    t0 = time.perf_counter()
+    if profiler is not None:
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Otra herramienta de perfilado (depurador, cobertura) ya está activa
+            log.info(f"🔬 {name}: sin perfil cpu ({e})")
+            profiler = None
+            _cpu_lock.release()
+    try:
+        yield result
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _cpu_lock.release()
+        seconds = time.perf_counter() - t0
+        keep = seconds >= min_seconds
+        if sampler is not None:
+            sampler.stop()
+        snapshot = None
+        if base_memory is not None:
+            peak, snapshot = _mem_stop(keep)
+            result["peak_mb"] = round(max(peak - base_memory, 0) / _MB, 1)
+        _local.active = False
+        if keep and (profiler, sampler, snapshot) != (None, None, None):
+            _save(Path(directory), name, profiler, sampler, snapshot, result)
+
+
+def profile(name, directory, sample=True, min_seconds=0.0):
+    """
+    Perfila el bloque según los modos activos y guarda los archivos en
+    `directory`. Devuelve un dict que al salir tiene peak_mb (modo mem).
+    Sin perfilado, o dentro de otro bloque perfilado del mismo hilo, es un
+    nullcontext.
+    """
+    if not enabled() or getattr(_local, "active", False):
+        return nullcontext({})
+    return _profile(name, directory, sample, min_seconds)
+
+
+def profiled(func):
+    """
+    Decorador para los loaders del dashboard. Los modos se consultan en
+    cada llamada: sin perfilado activo llama a la función directamente.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not enabled():
+            return func(*args, **kwargs)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+        directory = profiles_dir() / "dashboard"
+        with profile(f"{stamp}_{func.__name__}", directory, sample=False, min_seconds=LOADER_MIN_SECONDS):
+            return func(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,199 @@
+# utils/query.py
+"""
+Capa de consultas sobre las tablas materializadas (utils/mart.py).
+
+Los filtros de las páginas (rango de fechas, plantel, tipo de test, jugador)
+y las agregaciones se traducen a SQL y se ejecutan con DuckDB directamente
+sobre los Parquet: solo se materializa en pandas el resultado. Si DuckDB no
+está instalado se usa la lectura de Parquet con filtros de pyarrow.
+
+Los filtros se expresan como un dict columna -> valor:
+    - lista/tupla de valores   -> columna IN (...)
+    - ("between", desde, hasta) -> desde <= columna <= hasta
+Las listas vacías o None se ignoran.
+"""
+import threading
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pyarrow.types as pat
+
+from utils.mart import mart_path
+
+# DuckDB es opcional
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+_conn = None
+_conn_lock = threading.Lock()
+
+
+def _cursor():
+    """Cursor propio por consulta sobre una conexión en memoria compartida."""
+    global _conn
+    with _conn_lock:
+        if _conn is None:
+            _conn = duckdb.connect(database=":memory:")
+        return _conn.cursor()
+
+
+def between(desde, hasta):
+    """Filtro de rango inclusivo."""
+    return ("between", desde, hasta)
+
+
+def _quote(col):
+    return '"' + col.replace('"', '""') + '"'
+
+
+def _clean(filters):
+    """Descarta filtros vacíos y normaliza los rangos de fechas."""
+    cleaned = {}
+    for col, value in (filters or {}).items():
+        if value is None:
+            continue
+        if isinstance(value, tuple) and len(value) == 3 and value[0] == "between":
+            _, desde, hasta = value
+            if desde is None or hasta is None:
+                continue
+            cleaned[col] = ("between", pd.Timestamp(desde), pd.Timestamp(hasta)) if _is_date(desde) else value
+        elif len(value):
+            cleaned[col] = list(value)
+    return cleaned
+
+
+def _is_date(value):
+    return hasattr(value, "year") and hasattr(value, "month")
+
+
+def _where(filters):
+    """Construye la cláusula WHERE con parámetros (sin interpolar valores)."""
+    clauses, params = [], []
+    for col, value in filters.items():
+        if isinstance(value, tuple):
+            clauses.append(f"{_quote(col)} BETWEEN ? AND ?")
+            params += [value[1], value[2]]
+        else:
+            clauses.append(f"{_quote(col)} IN ({', '.join('?' * len(value))})")
+            params += value
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def _arrow_filters(filters):
+    """Traduce los filtros al formato de pd.read_parquet(filters=...)."""
+    out = []
+    for col, value in filters.items():
+        if isinstance(value, tuple):
+            out += [(col, ">=", value[1]), (col, "<=", value[2])]
+        else:
+            out.append((col, "in", value))
+    return out or None
+
+
+def _source(name):
+    path = mart_path(name)
+    if not path.exists():
+        raise FileNotFoundError(f"No existe la tabla materializada {name}")
+    return path
+
+
+def columns(name):
+    """Nombres de columna de la tabla (solo lee el esquema del Parquet)."""
+    return pq.read_schema(_source(name)).names
+
+
+def select(name, filters=None, columns=None, limit=None, offset=0):
+    """Filas de la tabla `name` que cumplen los filtros (opcionalmente paginadas)."""
+    path = _source(name)
+    filters = _clean(filters)
+    if duckdb is None:
+        df = pd.read_parquet(path, columns=columns, filters=_arrow_filters(filters))
+        if limit is not None:
+            df = df.iloc[offset:offset + limit].reset_index(drop=True)
+        return df
+    cols = ", ".join(_quote(c) for c in columns) if columns else "*"
+    where, params = _where(filters)
+    sql = f"SELECT {cols} FROM read_parquet(?){where}"
+    if limit is not None:
+        sql += f" LIMIT {int(limit)} OFFSET {int(offset)}"
+    return _cursor().execute(sql, [str(path)] + params).df()
+
+
+def count(name, filters=None):
+    """Cantidad de filas que cumplen los filtros."""
+    path = _source(name)
+    filters = _clean(filters)
+    if duckdb is None:
+        first = pq.read_schema(path).names[0]
+        return len(pd.read_parquet(path, columns=[first], filters=_arrow_filters(filters)))
+    where, params = _where(filters)
+    sql = f"SELECT COUNT(*) FROM read_parquet(?){where}"
+    return _cursor().execute(sql, [str(path)] + params).fetchone()[0]
+
+
+def numeric_columns(name):
+    """Columnas numéricas de la tabla según el esquema del Parquet."""
+    schema = pq.read_schema(_source(name))
+    return [f.name for f in schema if pat.is_integer(f.type) or pat.is_floating(f.type)]
+
+
+def distinct(name, column, filters=None):
+    """Valores distintos (ordenados, sin nulos) de una columna."""
+    path = _source(name)
+    filters = _clean(filters)
+    if duckdb is None:
+        df = pd.read_parquet(path, columns=[column], filters=_arrow_filters(filters))
+        return sorted(df[column].dropna().unique())
+    where, params = _where(filters)
+    where += (" AND " if where else " WHERE ") + f"{_quote(column)} IS NOT NULL"
+    sql = f"SELECT DISTINCT {_quote(column)} FROM read_parquet(?){where} ORDER BY 1"
+    return [row[0] for row in _cursor().execute(sql, [str(path)] + params).fetchall()]
+
+
+def bounds(name, column, filters=None):
+    """(mínimo, máximo) de una columna, o (None, None) si no hay filas."""
+    path = _source(name)
+    filters = _clean(filters)
+    if duckdb is None:
+        s = pd.read_parquet(path, columns=[column], filters=_arrow_filters(filters))[column]
+        return (s.min(), s.max()) if s.notna().any() else (None, None)
+    where, params = _where(filters)
+    sql = f"SELECT MIN({_quote(column)}), MAX({_quote(column)}) FROM read_parquet(?){where}"
+    return tuple(_cursor().execute(sql, [str(path)] + params).fetchone())
+
+
+def aggregate(name, by, metric, filters=None):
+    """
+    Mínimo, máximo, media y cantidad de `metric` agrupado por `by`
+    (columnas Min, Max, Media, N), ordenado por `by`.
+    """
+    path = _source(name)
+    filters = _clean(filters)
+    if duckdb is None:
+        df = pd.read_parquet(path, columns=[by, metric], filters=_arrow_filters(filters))
+        return (
+            df.groupby(by, observed=True)[metric]
+            .agg(Min="min", Max="max", Media="mean", N="count")
+            .reset_index()
+            .sort_values(by)
+        )
+    where, params = _where(filters)
+    m = _quote(metric)
+    sql = (
+        f"SELECT {_quote(by)}, MIN({m}) AS Min, MAX({m}) AS Max, AVG({m}) AS Media, COUNT({m}) AS N "
+        f"FROM read_parquet(?){where} GROUP BY 1 ORDER BY 1"
+    )
+    return _cursor().execute(sql, [str(path)] + params).df()
+
+
+def mean(name, metric, filters=None):
+    """Media global de `metric` con los filtros aplicados."""
+    path = _source(name)
+    filters = _clean(filters)
+    if duckdb is None:
+        return pd.read_parquet(path, columns=[metric], filters=_arrow_filters(filters))[metric].mean()
+    where, params = _where(filters)
+    sql = f"SELECT AVG({_quote(metric)}) FROM read_parquet(?){where}"
+    return _cursor().execute(sql, [str(path)] + params).fetchone()[0]
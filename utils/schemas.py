@@ -0,0 +1,226 @@
+# utils/schemas.py
+"""
+Esquemas de los datasets que genera el extractor.
+
+Define, para cada CSV de output_data, qué columnas se leen, con qué tipos y
+cuáles son fechas reales. Lo usan tanto el dashboard (utils/data_loader.py)
+como el pipeline de extracción, por eso no depende de Streamlit.
+"""
+from pathlib import Path
+
+import pandas as pd
+
+from utils.normalize import parse_offsets
+
+# Directorio donde el extractor deja los CSV (mismo que utils/extractor.py)
+OUTPUT_DIR = Path(__file__).resolve().parent / "output_data"
+
+# pyarrow es opcional: si está instalado se usa su parser de CSV multihilo
+# y los textos se guardan en buffers Arrow en lugar de objetos Python
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = "pyarrow"
+    STRING = "string[pyarrow]"
+except ImportError:
+    CSV_ENGINE = "c"
+    STRING = "string"
+
+# Tipos de columna del registro de esquemas
+ID = "category"         # UUID que se repite (profileId, testTypeId, tenant_id...): códigos enteros + tabla de valores
+UNIQUE_ID = STRING      # UUID único por fila (testId, recordingId): no gana nada como categoría
+LABEL = "category"      # texto de baja cardinalidad (tipo de test, dispositivo, grupo)
+TEXT = STRING           # texto libre (notas, nombres, JSON anidado)
+METRIC = "float32"      # fuerzas, impulsos, torques, peso: 7 dígitos significativos alcanzan
+COUNT = "Int16"         # repeticiones
+OFFSET = "Int16"        # offset de zona horaria en minutos
+DATE = STRING           # se lee como texto y se parsea con formato ISO 8601 (ver "dates")
+
+
+# Definición de cada dataset: archivo, columnas a leer (None = todas),
+# tipos explícitos, columnas de fecha (ISO 8601) a parsear y, opcionalmente,
+# offsets de zona horaria (ver utils/normalize.parse_offsets)
+DATASETS = {
+    "profiles": {
+        "file": "all_profiles.csv",
+        "usecols": ["profileId", "givenName", "familyName", "dateOfBirth", "groupName"],
+        "dtype": {
+            "profileId": ID,
+            "givenName": TEXT,
+            "familyName": TEXT,
+            "dateOfBirth": DATE,
+            "groupName": LABEL,
+        },
+        "dates": ["dateOfBirth"],
+    },
+    "nordbord": {
+        "file": "all_nordbord.csv",
+        "usecols": None,
+        "dtype": {
+            "profileId": ID,
+            "testId": UNIQUE_ID,
+            "modifiedDateUtc": DATE,
+            "testDateUtc": DATE,
+            "testTypeId": ID,
+            "testTypeName": LABEL,
+            "notes": TEXT,
+            "device": LABEL,
+            "leftAvgForce": METRIC,
+            "leftImpulse": METRIC,
+            "leftMaxForce": METRIC,
+            "leftTorque": METRIC,
+            "leftCalibration": METRIC,
+            "leftRepetitions": COUNT,
+            "rightAvgForce": METRIC,
+            "rightImpulse": METRIC,
+            "rightMaxForce": METRIC,
+            "rightTorque": METRIC,
+            "rightCalibration": METRIC,
+            "rightRepetitions": COUNT,
+            "tenant_id": ID,
+        },
+        "dates": ["modifiedDateUtc", "testDateUtc"],
+    },
+    "forceframe": {
+        "file": "all_forceframe.csv",
+        "usecols": None,
+        "dtype": {
+            "profileId": ID,
+            "testId": UNIQUE_ID,
+            "testDateUtc": DATE,
+            "testTypeId": ID,
+            "testPositionId": ID,
+            "notes": TEXT,
+            **{
+                f"{side}{metric}": METRIC
+                for side in ("innerLeft", "innerRight", "outerLeft", "outerRight")
+                for metric in ("AvgForce", "Impulse", "MaxForce")
+            },
+            **{
+                f"{side}Repetitions": COUNT
+                for side in ("innerLeft", "innerRight", "outerLeft", "outerRight")
+            },
+            "device": LABEL,
+            "modifiedDateUtc": DATE,
+            "testTypeName": LABEL,
+            "testPositionName": LABEL,
+            "tenant_id": ID,
+        },
+        "dates": ["modifiedDateUtc", "testDateUtc"],
+    },
+    "forcedecks": {
+        "file": "all_forcedecks.csv",
+        "usecols": None,
+        "dtype": {
+            "testId": UNIQUE_ID,
+            "tenantId": ID,
+            "profileId": ID,
+            "recordingId": UNIQUE_ID,
+            "modifiedDateUtc": DATE,
+            "recordedDateUtc": DATE,
+            "recordedDateOffset": OFFSET,
+            "recordedDateTimezone": LABEL,
+            "analysedDateUtc": DATE,
+            "analysedDateOffset": OFFSET,
+            "analysedDateTimezone": LABEL,
+            "testType": LABEL,
+            "weight": METRIC,
+            "notes": TEXT,
+            "tenant_id": ID,
+        },
+        "dates": ["modifiedDateUtc", "recordedDateUtc", "analysedDateUtc"],
+        "offsets": ["recordedDateOffset", "analysedDateOffset"],
+    },
+    # Dispositivos sin tabla en el dashboard: solo las columnas comunes tienen tipo
+    **{
+        name: {
+            "file": f"all_{name}.csv",
+            "usecols": None,
+            "dtype": {
+                "profileId": ID,
+                "testId": UNIQUE_ID,
+                "modifiedDateUtc": DATE,
+                "testDateUtc": DATE,
+                "testTypeName": LABEL,
+                "notes": TEXT,
+                "tenant_id": ID,
+            },
+            "dates": ["modifiedDateUtc", "testDateUtc"],
+        }
+        for name in ("dynamo", "smartspeed", "humantrak")
+    },
+    # Tablas laterales de ForceDecks (ver utils/normalize.py)
+    "forcedecks_parameters": {
+        "file": "all_forcedecks_parameters.csv",
+        "usecols": None,
+        "dtype": {"testId": ID, "Origen": LABEL, "resultId": "Int32", "value": METRIC},
+        "dates": [],
+    },
+    "forcedecks_attributes": {
+        "file": "all_forcedecks_attributes.csv",
+        "usecols": None,
+        "dtype": {
+            "testId": ID,
+            "Origen": LABEL,
+            "attributeValueId": ID,
+            "attributeValueName": LABEL,
+            "attributeTypeId": ID,
+            "attributeTypeName": LABEL,
+        },
+        "dates": [],
+    },
+    # Resultados por trial de ForceDecks (ver utils/trials.py)
+    "forcedecks_results": {
+        "file": "all_forcedecks_results.parquet",
+        "usecols": None,
+        "dtype": {"testId": ID, "trialId": ID, "result": LABEL, "unit": LABEL, "limb": LABEL, "value": "float64"},
+        "dates": [],
+    },
+}
+
+
+def dataset_path(name, output_dir=OUTPUT_DIR):
+    """Ruta del archivo (CSV o Parquet) asociado a un dataset."""
+    return Path(output_dir) / DATASETS[name]["file"]
+
+
+def dataset_version(name, output_dir=OUTPUT_DIR):
+    """Versión del dataset (mtime en ns) o None si el archivo no existe."""
+    try:
+        return dataset_path(name, output_dir).stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def read_csv_typed(path, usecols=None, dtype=None, dates=(), offsets=()):
+    """
+    Lee un CSV con tipos explícitos y parsea solo las columnas de fecha
+    indicadas. Los offsets se leen como texto y se convierten a minutos
+    (los CSV de versiones anteriores los tienen como fechas de 1969).
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    if usecols is not None:
+        usecols = [c for c in usecols if c in header]
+    dtype = {c: t for c, t in (dtype or {}).items() if c in header and (usecols is None or c in usecols)}
+    offsets = [c for c in offsets if c in header and (usecols is None or c in usecols)]
+    dtype.update({c: STRING for c in offsets})
+    try:
+        df = pd.read_csv(path, usecols=usecols, dtype=dtype, engine=CSV_ENGINE)
+    except ValueError:
+        # Algunas combinaciones de tipos no las soporta pyarrow: volver al parser C
+        df = pd.read_csv(path, usecols=usecols, dtype=dtype)
+    for col in dates:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors="coerce", utc=True, format="ISO8601")
+    return parse_offsets(df, offsets)
+
+
+def read_dataset(name, output_dir=OUTPUT_DIR):
+    """Lee un dataset según su esquema; None si el archivo no existe."""
+    path = dataset_path(name, output_dir)
+    if not path.exists():
+        return None
+    spec = DATASETS[name]
+    if path.suffix == ".parquet":
+        df = pd.read_parquet(path, columns=spec["usecols"])
+        return df.astype({c: t for c, t in spec["dtype"].items() if c in df.columns})
+    return read_csv_typed(path, spec["usecols"], spec["dtype"], spec["dates"], spec.get("offsets", ()))
@@ -0,0 +1,61 @@
+# utils/store.py
+"""
+Almacén de datasets compartido por todas las sesiones del proceso.
+
+Guarda una sola copia tipada de cada tabla junto con su versión (mtime del
+archivo). Cuando aparece una versión nueva se carga fuera del camino de
+lectura y se reemplaza la referencia de forma atómica: las sesiones que
+estaban usando la copia anterior la conservan hasta terminar su rerun.
+
+Los DataFrames que devuelve son de SOLO LECTURA: las páginas deben filtrar
+o usar .assign() / .copy() antes de modificar columnas.
+"""
+import threading
+
+
+class DatasetStore:
+    """Caché de DataFrames por clave y versión, segura entre hilos."""
+
+    def __init__(self):
+        self._entries = {}  # clave -> (versión, DataFrame)
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(self, key, version, loader):
+        """
+        Devuelve el DataFrame de `key` para `version`; si la versión cambió lo
+        recarga con `loader()` (una sola vez aunque lo pidan varias sesiones).
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        with self._key_lock(key):
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                df = loader()
+                # Reemplazo atómico de la referencia (la copia vieja se libera sola)
+                self._entries[key] = (version, df)
+            return self._entries[key][1]
+
+    def invalidate(self, key=None):
+        """Descarta una clave (o todas) para forzar la recarga."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        """Filas y memoria (MB) de cada tabla cargada."""
+        return {
+            key: {
+                "version": version,
+                "filas": len(df),
+                "memoria_mb": round(float(df.memory_usage(deep=True).sum()) / 1024 ** 2, 2),
+            }
+            for key, (version, df) in list(self._entries.items())
+        }
@@ -0,0 +1,99 @@
+# utils/transforms.py
+"""
+Transformaciones vectorizadas compartidas por el pipeline y las páginas.
+
+Todas operan sobre columnas completas (NumPy / pandas) en lugar de aplicar
+funciones Python fila por fila, así los resultados son idénticos en todas
+las páginas y el costo no crece con apply sobre cada fecha.
+"""
+import numpy as np
+import pandas as pd
+
+
+def _ymd(values):
+    """Descompone fechas datetime64 en arrays de año, mes y día."""
+    days = values.astype("datetime64[D]")
+    years = days.astype("datetime64[Y]").astype(np.int64) + 1970
+    months = days.astype("datetime64[M]").astype(np.int64) % 12 + 1
+    day = (days - days.astype("datetime64[M]")).astype(np.int64) + 1
+    return years, months, day
+
+
+def _naive(series):
+    """Convierte a datetime64 sin zona horaria (fechas UTC o locales)."""
+    if not pd.api.types.is_datetime64_any_dtype(series):
+        series = pd.to_datetime(series, errors="coerce", format="ISO8601")
+    if getattr(series.dt, "tz", None) is not None:
+        series = series.dt.tz_localize(None)
+    return series
+
+
+def age_at(birth_dates, reference=None):
+    """
+    Edad en años cumplidos a la fecha de referencia (hoy si es None).
+    Se calcula con aritmética de fechas de NumPy: (AAAAMMDD_ref - AAAAMMDD_nac) // 10000.
+    """
+    birth = _naive(birth_dates)
+    if reference is None:
+        ref_values = np.full(len(birth), np.datetime64(pd.Timestamp("today").normalize().date(), "D"))
+        ref_mask = np.zeros(len(birth), dtype=bool)
+    else:
+        ref = _naive(reference)
+        ref_values = ref.to_numpy(dtype="datetime64[ns]")
+        ref_mask = ref.isna().to_numpy()
+    mask = birth.isna().to_numpy() | ref_mask
+    birth_values = birth.to_numpy(dtype="datetime64[ns]")
+    # Valores de relleno para NaT; el resultado se enmascara después
+    birth_values = np.where(mask, np.datetime64("2000-01-01"), birth_values)
+    ref_values = np.where(mask, np.datetime64("2000-01-01"), ref_values)
+
+    by, bm, bd = _ymd(birth_values)
+    ry, rm, rd = _ymd(ref_values)
+    ages = ((ry * 10000 + rm * 100 + rd) - (by * 10000 + bm * 100 + bd)) // 10000
+    result = pd.Series(ages, index=birth.index, dtype="Int64")
+    result[mask] = pd.NA
+    return result
+
+
+def imbalance_pct(left, right):
+    """Diferencia absoluta L/R como porcentaje del lado más fuerte."""
+    left = np.asarray(left, dtype="float64")
+    right = np.asarray(right, dtype="float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.abs(right - left) / np.fmax(left, right) * 100
+
+
+def coerce_numeric(df, columns):
+    """Convierte a número solo las columnas indicadas (las que existan)."""
+    for col in columns:
+        if col in df.columns and not pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+
+def round_numeric(df, decimals=2):
+    """Redondea las columnas numéricas de punto flotante."""
+    float_cols = df.select_dtypes(include="floating").columns
+    if len(float_cols):
+        df[float_cols] = df[float_cols].round(decimals)
+    return df
+
+
+def to_date(series):
+    """Fecha sin hora ni zona horaria (datetime64 normalizado)."""
+    return _naive(series).dt.normalize()
+
+
+def full_name(first, last):
+    """Nombre y apellido en una sola columna, sin espacios sobrantes."""
+    first = first.astype("string").fillna("")
+    last = last.astype("string").fillna("")
+    return (first + " " + last).str.strip()
+
+
+def to_categories(df, columns):
+    """Convierte a category las columnas de texto indicadas (las que existan)."""
+    for col in columns:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    return df
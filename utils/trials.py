@@ -0,0 +1,187 @@
+# utils/trials.py
+"""
+Resultados por trial de los tests de ForceDecks.
+
+El listado /tests de ForceDecks solo trae la cabecera de cada test; las
+métricas del salto (altura, potencia, RSI...) están en los trials, que
+requieren una llamada por testId. Esta etapa:
+    - descarga en paralelo (pool acotado) solo los tests nuevos o modificados;
+    - guarda la respuesta de cada test en una caché inmutable por testId
+      (un archivo por test y versión), así nunca se vuelve a pedir; un
+      índice testId -> modifiedDateUtc junto a la caché evita abrir esos
+      archivos para decidir qué falta;
+    - mantiene la tabla columnar all_forcedecks_results.parquet (una fila
+      por resultado) agregando solo los tests descargados.
+"""
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from utils import http, jsonio, logs
+from utils.fileio import atomic_write
+
+log = logs.get_logger("trials")
+
+FORCEDECKS_HOST = "https://prd-use-api-extforcedecks.valdperformance.com"
+TRIALS_ENDPOINT = "/v2019q3/teams/{tenant_id}/tests/{test_id}/trials"
+
+CACHE_DIR_NAME = os.path.join("cache", "forcedecks_trials")
+RESULTS_FILE = "all_forcedecks_results.parquet"
+# Índice de la caché: testId -> modifiedDateUtc de la versión guardada
+INDEX_FILE = "index.json"
+
+RESULT_COLUMNS = ["testId", "trialId", "trialLimb", "resultId", "result", "unit", "limb", "repeat", "value"]
+
+# Resultados que se agregan a la tabla de ForceDecks (media de los trials bilaterales)
+FORCEDECKS_RESULTS = {
+    "JUMP_HEIGHT_IMP_MOM": "Altura de salto (cm)",
+    "PEAK_CONCENTRIC_FORCE": "Fuerza pico concéntrica (N)",
+    "PEAK_TAKEOFF_POWER": "Potencia pico (W)",
+    "RSI_MODIFIED": "RSI modificado (m/s)",
+    "CONCENTRIC_IMPULSE": "Impulso concéntrico (Ns)",
+}
+
+
+def cache_dir(output_dir):
+    return Path(output_dir) / CACHE_DIR_NAME
+
+
+def _cache_path(output_dir, test_id):
+    return cache_dir(output_dir) / f"{test_id}.json"
+
+
+def _index_path(output_dir):
+    return cache_dir(output_dir) / INDEX_FILE
+
+
+def load_index(output_dir):
+    """
+    testId -> modifiedDateUtc de los tests cacheados. Si el índice no existe
+    (caché de una versión anterior) se arma una vez leyendo los archivos.
+    """
+    path = _index_path(output_dir)
+    if path.exists():
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    index = {}
+    for cached in cache_dir(output_dir).glob("*.json"):
+        if cached.name == INDEX_FILE:
+            continue
+        with open(cached, encoding="utf-8") as f:
+            index[cached.stem] = json.load(f).get("modifiedDateUtc")
+    return index
+
+
+def save_index(output_dir, index):
+    """Escritura atómica del índice de la caché."""
+    with atomic_write(_index_path(output_dir)) as tmp_path, open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+
+
+def _write_cache(output_dir, test_id, modified, trials):
+    """Escritura atómica del archivo de caché de un test."""
+    with atomic_write(_cache_path(output_dir, test_id)) as tmp_path, open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"testId": test_id, "modifiedDateUtc": modified, "trials": trials}, f)
+
+
+def fetch_trials(token, tenant_id, test_id):
+    """Trials de un test (lista vacía si la API no devuelve contenido)."""
+    url = FORCEDECKS_HOST + TRIALS_ENDPOINT.format(tenant_id=tenant_id, test_id=test_id)
+    response = http.get(url, token)
+    if response.status_code == 204 or not response.content:
+        return []
+    response.raise_for_status()
+    data = jsonio.loads(response.content)
+    return data.get("trials", data) if isinstance(data, dict) else data
+
+
+def flatten_trials(test_id, trials):
+    """Una fila por resultado de cada trial (formato largo)."""
+    rows = []
+    for trial in trials or []:
+        for result in trial.get("results") or []:
+            definition = result.get("definition") or {}
+            rows.append({
+                "testId": test_id,
+                "trialId": trial.get("id"),
+                "trialLimb": trial.get("limb"),
+                "resultId": result.get("resultId"),
+                "result": definition.get("result"),
+                "unit": definition.get("unit"),
+                "limb": result.get("limb"),
+                "repeat": result.get("repeat"),
+                "value": result.get("value"),
+            })
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+
+def pending_tests(df_tests, index):
+    """testIds sin caché o cuya versión (modifiedDateUtc) cambió según el índice."""
+    modified = df_tests["modifiedDateUtc"].astype(str) if "modifiedDateUtc" in df_tests else ""
+    versions = pd.DataFrame({"testId": df_tests["testId"].astype(str), "modified": modified})
+    return [
+        (row.testId, row.modified)
+        for row in versions.drop_duplicates("testId", keep="last").itertuples()
+        if index.get(row.testId) != row.modified
+    ]
+
+
+def harvest_trials(token, tenant_id, df_tests, output_dir, max_workers=http.MAX_WORKERS):
+    """
+    Descarga los trials de los tests nuevos o modificados y actualiza la
+    tabla de resultados. Devuelve la cantidad de tests descargados.
+    """
+    if df_tests is None or df_tests.empty or "testId" not in df_tests.columns:
+        return 0
+    cache_dir(output_dir).mkdir(parents=True, exist_ok=True)
+    index = load_index(output_dir)
+    pending = pending_tests(df_tests, index)
+    log.info(f"🔄 Trials de ForceDecks: {len(pending)} tests nuevos o modificados")
+
+    fetched, errors = [], 0
+    for (test_id, modified), trials, error in http.map_concurrent(
+        lambda item: fetch_trials(token, tenant_id, item[0]), pending, max_workers
+    ):
+        if error is not None:
+            errors += 1
+            continue
+        _write_cache(output_dir, test_id, modified, trials)
+        index[test_id] = modified
+        fetched.append(flatten_trials(test_id, trials))
+
+    if fetched or not _index_path(output_dir).exists():
+        save_index(output_dir, index)
+    if pending and errors:
+        log.warning(f"⚠️ {errors} tests sin trials (se reintentarán en la próxima extracción)")
+    update_results(output_dir, fetched, df_tests["testId"].astype(str))
+    log.info(f"✅ Trials de ForceDecks actualizados ({len(fetched)} tests descargados)")
+    return len(fetched)
+
+
+def update_results(output_dir, new_frames, current_ids):
+    """Reemplaza en la tabla de resultados las filas de los tests descargados."""
+    path = Path(output_dir) / RESULTS_FILE
+    results = pd.read_parquet(path) if path.exists() else pd.DataFrame(columns=RESULT_COLUMNS)
+    new_frames = [f for f in new_frames if not f.empty]
+    if new_frames:
+        new = pd.concat(new_frames, ignore_index=True)
+        results = results[~results["testId"].isin(new["testId"].unique())]
+        results = pd.concat([results, new], ignore_index=True) if not results.empty else new
+    # Tests que ya no existen en la API
+    results = results[results["testId"].isin(current_ids)]
+    results = results.astype({"testId": "string", "result": "string", "unit": "string", "limb": "string",
+                              "trialLimb": "string", "value": "float64"})
+    with atomic_write(path) as tmp_path:
+        results.to_parquet(tmp_path, index=False)
+    return results
+
+
+def results_wide(df_results, names=FORCEDECKS_RESULTS):
+    """Media por test de los resultados bilaterales seleccionados, una columna por resultado."""
+    df = df_results[df_results["result"].isin(list(names))]
+    if "limb" in df.columns:
+        df = df[df["limb"].isna() | (df["limb"] == "Trial")]
+    wide = df.pivot_table(index="testId", columns="result", values="value", aggfunc="mean", observed=True)
+    return wide.rename(columns=names).reset_index()